@@ -0,0 +1,23 @@
+"""
+ASGI config for foodgram project.
+
+Django 2.2 не умеет ASGI и асинхронные представления, поэтому WSGI-
+приложение оборачивается в a2wsgi: сервер (uvicorn) держит соединения
+в event loop, а каждый запрос выполняется в пуле из ASGI_THREADS потоков.
+Медленный запрос к базе занимает поток, а не целый процесс-воркер,
+как у синхронных воркеров gunicorn.
+
+    uvicorn foodgram.asgi:application --workers 2 --host 0.0.0.0
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+application = WSGIMiddleware(
+    get_wsgi_application(),
+    workers=int(os.getenv('ASGI_THREADS', default=16)),
+)
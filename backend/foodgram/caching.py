@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+# Кэши в памяти процесса: сброс или смена версии в одном воркере
+# не видны остальным.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """Общий ли кэш для всех процессов. Данные со сбросом по версии
+    кэшируются только в общем кэше, иначе читаются из базы."""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    """Версии по ключам одним cache.get_many. Отсутствующие заводятся
+    от текущего времени в миллисекундах, чтобы после вытеснения
+    не совпасть с прежней версией."""
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _now(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump_version(key):
+    """Атомарно увеличивает версию хотя бы на единицу, подтягивая её
+    к текущему времени: параллельные смены версии не теряются, а сама
+    версия остаётся временем последнего изменения."""
+    now = _now()
+    try:
+        return cache.incr(key, max(now - (cache.get(key) or now), 1))
+    except ValueError:
+        cache.set(key, now, None)
+        return now
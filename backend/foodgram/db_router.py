@@ -0,0 +1,99 @@
+import hashlib
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# На реплику уходят только чтения API; админка работает с основной базой.
+REPLICA_PATH_PREFIX = '/api/'
+# Токены читаются из основной базы: только что выданный токен может
+# ещё не доехать до реплики.
+PRIMARY_MODELS = {'authtoken.token'}
+
+_state = threading.local()
+
+
+def get_current_replica():
+    return getattr(_state, 'replica', None)
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут в основную базу. Нужно для заполнения
+    общих кэшей: отставшая реплика положила бы в них старые данные
+    под новой версией."""
+    replica = get_current_replica()
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+def _get_pin_key(request):
+    """Клиент узнаётся по заголовку Authorization, который известен
+    до аутентификации DRF; в кэше хранится только хеш."""
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        return None
+    return 'db_pin:' + hashlib.sha256(header.encode()).hexdigest()
+
+
+def is_pinned(request):
+    key = _get_pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def pin_to_primary(request):
+    """После записи клиент DB_PIN_SECONDS читает из основной базы
+    и видит свои изменения, даже если реплика отстаёт."""
+    key = _get_pin_key(request)
+    if key is not None:
+        cache.set(key, True, settings.DB_PIN_SECONDS)
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает реплику для безопасных запросов к API, если клиент
+    недавно ничего не записывал. Выбор держится до конца запроса."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            request.method in SAFE_METHODS
+            and request.path.startswith(REPLICA_PATH_PREFIX)
+            and not is_pinned(request)
+        ):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request)
+        return response
+
+
+class ReplicaRouter:
+    """Чтения внутри запроса, для которого выбрана реплика, идут в неё;
+    всё остальное — записи, транзакции, команды — в основную базу."""
+    def db_for_read(self, model, **hints):
+        replica = get_current_replica()
+        if (
+            replica is None
+            or model._meta.label_lower in PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
@@ -0,0 +1,251 @@
+"""Метрики по представлениям и действиям в текстовом формате Prometheus.
+
+Подключается только при METRICS_ENABLED: тогда MetricsMiddleware стоит
+первым в MIDDLEWARE, а /api/metrics/ отдаёт накопленное по METRICS_TOKEN
+или сотруднику. Выключенные метрики почти ничего не стоят: middleware
+нет, сериализаторы не обёрнуты, а обёртка быстрого пути рецептов только
+проверяет thread-local. Значения копятся в памяти процесса, каждый
+воркер отдаёт свои.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+SLOW_LOG_QUERIES = 5
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        cumulative = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, request_metrics, elapsed):
+        key = (request_metrics.view, request_metrics.action)
+        with self._lock:
+            endpoint = self._endpoints.get(key)
+            if endpoint is None:
+                endpoint = self._endpoints[key] = EndpointMetrics()
+            endpoint.latency.observe(elapsed)
+            endpoint.queries.observe(request_metrics.queries)
+            endpoint.db_seconds += request_metrics.db_seconds
+            endpoint.serializer_seconds += request_metrics.serializer_seconds
+
+    def render(self):
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP foodgram_request_duration_seconds '
+                'Время обработки запроса.',
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for key, endpoint in endpoints:
+                lines.extend(endpoint.latency.render(
+                    'foodgram_request_duration_seconds', format_labels(*key),
+                ))
+            lines += [
+                '# HELP foodgram_request_queries SQL-запросов за запрос.',
+                '# TYPE foodgram_request_queries histogram',
+            ]
+            for key, endpoint in endpoints:
+                lines.extend(endpoint.queries.render(
+                    'foodgram_request_queries', format_labels(*key),
+                ))
+            for name, attribute, help_text in (
+                ('foodgram_db_seconds_total', 'db_seconds',
+                 'Время выполнения SQL.'),
+                ('foodgram_serializer_seconds_total', 'serializer_seconds',
+                 'Время сериализации ответа.'),
+            ):
+                lines += [
+                    f'# HELP {name} {help_text}',
+                    f'# TYPE {name} counter',
+                ]
+                lines.extend(
+                    f'{name}{{{format_labels(*key)}}} '
+                    f'{getattr(endpoint, attribute)}'
+                    for key, endpoint in endpoints
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def escape_label(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def format_labels(view, action):
+    return f'view="{escape_label(view)}",action="{escape_label(action)}"'
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; execute — обёртка для execute_wrapper."""
+    def __init__(self):
+        self.view = 'unknown'
+        self.action = 'unknown'
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.timings = []
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += duration
+            self.timings.append((duration, sql))
+
+
+def timed_serialization(function):
+    """Добавляет время вызова к сериализации текущего запроса. Без
+    метрик обёртка только проверяет, что счётчиков запроса нет."""
+    @wraps(function)
+    def timed(*args, **kwargs):
+        request_metrics = getattr(_local, 'metrics', None)
+        if request_metrics is None:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            request_metrics.serializer_seconds += (
+                time.perf_counter() - started
+            )
+
+    timed.timed = True
+    return timed
+
+
+def install_serializer_timer():
+    """Засекает время BaseSerializer.data: свойство вызывается только
+    у сериализатора верхнего уровня, вложенные вызывают
+    to_representation напрямую. Быстрый путь рецептов, который обходит
+    сериализаторы, засекается через timed_serialization."""
+    data = serializers.BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+    serializers.BaseSerializer.data = property(
+        timed_serialization(data.fget),
+    )
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = settings.METRICS_SLOW_REQUEST_MS / 1000
+        install_serializer_timer()
+
+    def __call__(self, request):
+        request_metrics = _local.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        elapsed = time.perf_counter() - started
+        registry.record(request_metrics, elapsed)
+        if elapsed >= self.slow_seconds:
+            self.log_slow_request(request, request_metrics, elapsed)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = getattr(_local, 'metrics', None)
+        if request_metrics is None:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        request_metrics.view = (
+            view_class.__name__ if view_class else view_func.__name__
+        )
+        actions = getattr(view_func, 'actions', None) or {}
+        request_metrics.action = actions.get(
+            request.method.lower(), request.method.lower(),
+        )
+        return None
+
+    @staticmethod
+    def log_slow_request(request, request_metrics, elapsed):
+        top = heapq.nlargest(
+            SLOW_LOG_QUERIES, request_metrics.timings, key=lambda row: row[0],
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s.%s): %.0f мс, SQL: %d за %.0f мс, '
+            'сериализация %.0f мс\n%s',
+            request.method, request.get_full_path(), request_metrics.view,
+            request_metrics.action, elapsed * 1000, request_metrics.queries,
+            request_metrics.db_seconds * 1000,
+            request_metrics.serializer_seconds * 1000,
+            '\n'.join(
+                f'  {duration * 1000:.1f} мс: {sql}' for duration, sql in top
+            ),
+        )
+
+
+def metrics_view(request):
+    """Метрики видны по METRICS_TOKEN или сотруднику, вошедшему
+    в админку; остальным эндпоинт не существует. Пустой токен
+    не открывает доступ."""
+    token = settings.METRICS_TOKEN
+    if not (
+        token and request.META.get('HTTP_AUTHORIZATION') == f'Bearer {token}'
+        or request.user.is_staff
+    ):
+        raise Http404
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -79,6 +79,42 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения через запятую: host[:port] для PostgreSQL
+# или путь к файлу для SQLite. Остальные параметры берутся из default.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1,
+):
+    alias = f'replica_{number}'
+    # В тестах реплика смотрит в тестовую копию основной базы.
+    DATABASES[alias] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'},
+    )
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        DATABASES[alias]['HOST'] = host
+        if port:
+            DATABASES[alias]['PORT'] = port
+    DATABASE_REPLICAS.append(alias)
+
+# Сколько секунд после записи клиент читает только из основной базы.
+DB_PIN_SECONDS = int(os.getenv('DB_PIN_SECONDS', default=10))
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+    MIDDLEWARE.insert(0, 'foodgram.db_router.ReplicaRoutingMiddleware')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,6 +158,32 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', default=2))
+
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000)
+)
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', default=1000))
+# Потоков для раскладки новых рецептов по лентам; 0 — прямо в запросе.
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', default=1))
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='False') == 'True'
+METRICS_SLOW_REQUEST_MS = int(
+    os.getenv('METRICS_SLOW_REQUEST_MS', default=500)
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'foodgram.metrics.MetricsMiddleware')
+
+AUTH_TOKEN_CACHE_SECONDS = int(
+    os.getenv('AUTH_TOKEN_CACHE_SECONDS', default=300)
+)
+# Токены кэшируются, только если этот кэш общий для процессов.
+AUTH_TOKEN_CACHE = 'default'
+RECIPE_CACHE_SECONDS = int(
+    os.getenv('RECIPE_CACHE_SECONDS', default=600)
+)
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -134,7 +196,11 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'recipes.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
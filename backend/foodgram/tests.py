@@ -0,0 +1,78 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from foodgram.db_router import ReplicaRoutingMiddleware
+from recipes.models import Tag
+
+AUTHORIZATION = 'Token 0123456789abcdef'
+
+
+@skipUnless(
+    settings.DATABASE_REPLICAS,
+    'Нужна реплика: DB_REPLICAS=/tmp/replica.sqlite3 manage.py test',
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Маршрутизация чтений между основной базой и репликой. В тестах
+    реплика — зеркало основной базы, поэтому проверяется, в какое
+    соединение ушёл запрос. TestCase не подходит: внутри его транзакции
+    все чтения идут в основную базу."""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.replica = settings.DATABASE_REPLICAS[0]
+
+    def read(self, request, in_transaction=False):
+        """Пропускает запрос через middleware с представлением, которое
+        читает теги; возвращает число чтений из основной базы и реплики."""
+        def view(request):
+            if in_transaction:
+                with transaction.atomic():
+                    list(Tag.objects.all())
+            else:
+                list(Tag.objects.all())
+            return HttpResponse()
+
+        with CaptureQueriesContext(
+            connections[DEFAULT_DB_ALIAS],
+        ) as primary, CaptureQueriesContext(
+            connections[self.replica],
+        ) as replica:
+            ReplicaRoutingMiddleware(view)(request)
+        return len(primary), len(replica)
+
+    def test_safe_read_goes_to_replica(self):
+        request = self.factory.get(
+            '/api/tags/', HTTP_AUTHORIZATION=AUTHORIZATION,
+        )
+        self.assertEqual(self.read(request), (0, 1))
+
+    def test_admin_read_goes_to_primary(self):
+        self.assertEqual(self.read(self.factory.get('/admin/')), (1, 0))
+
+    def test_read_after_write_is_pinned_to_primary(self):
+        ReplicaRoutingMiddleware(lambda request: HttpResponse(status=201))(
+            self.factory.post('/api/tags/', HTTP_AUTHORIZATION=AUTHORIZATION)
+        )
+        request = self.factory.get(
+            '/api/tags/', HTTP_AUTHORIZATION=AUTHORIZATION,
+        )
+        self.assertEqual(self.read(request), (1, 0))
+
+        other_client = self.factory.get(
+            '/api/tags/', HTTP_AUTHORIZATION='Token other',
+        )
+        self.assertEqual(self.read(other_client), (0, 1))
+
+    def test_read_in_transaction_goes_to_primary(self):
+        request = self.factory.get('/api/tags/')
+        primary, replica = self.read(request, in_transaction=True)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
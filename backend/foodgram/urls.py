@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from foodgram.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(('users.urls', 'users'), namespace='users')),
     path('api/', include(('recipes.urls', 'recipes'), namespace='recipes')),
 ]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.insert(0, path('api/metrics/', metrics_view, name='metrics'))
@@ -1,34 +1,95 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.html import format_html
 
-from recipes.models import IngredientRecipe, TagRecipe, Recipe, Tag, Ingredient
+from recipes.models import (
+    IngredientRecipe, TagRecipe, Recipe, Tag, Ingredient, ShoppingCart,
+)
+from recipes.services import (
+    get_recipe_amounts, update_shopping_lists, update_tags_mask,
+)
+
+INGREDIENT_LOOKUP = 'recipe_ingredients__ingredient__id__exact'
+
+
+def count_recipes(model, field):
+    """Подзапрос с числом рецептов: считается только для строк страницы,
+    без GROUP BY по всей таблице связей."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+class RecipesLinkMixin:
+    """Вместо инлайна со всеми связями показывает число рецептов
+    и ссылку на отфильтрованный список рецептов."""
+    recipes_lookup = None
+    readonly_fields = ('recipes_link',)
+
+    def recipes_link(self, obj):
+        url = reverse('admin:recipes_recipe_changelist')
+        return format_html(
+            '<a href="{}?{}={}">{}</a>',
+            url, self.recipes_lookup, obj.id, obj.recipes_total,
+        )
+
+    recipes_link.short_description = 'Рецептов'
+    recipes_link.admin_order_field = 'recipes_total'
 
 
 class TagInline(admin.TabularInline):
     model = TagRecipe
+    autocomplete_fields = ('tag',)
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tag', 'recipe')
 
 
 class IngredientInline(admin.TabularInline):
     model = IngredientRecipe
+    autocomplete_fields = ('ingredient',)
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'ingredient', 'recipe',
+        )
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
-    inlines = (
-        TagInline,
-    )
-    list_display = ('name', 'color', 'slug')
+class TagAdmin(RecipesLinkMixin, admin.ModelAdmin):
+    recipes_lookup = 'tags__id__exact'
+    list_display = ('name', 'color', 'slug', 'recipes_link')
     list_filter = ('name',)
-    search_fields = ('name',)
+    search_fields = ('name', 'slug')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_total=count_recipes(TagRecipe, 'tag'),
+        )
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
-    inlines = (
-        IngredientInline,
-    )
-    list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
-    search_fields = ('name',)
+class IngredientAdmin(RecipesLinkMixin, admin.ModelAdmin):
+    recipes_lookup = INGREDIENT_LOOKUP
+    list_display = ('name', 'measurement_unit', 'recipes_link')
+    search_fields = ('^name',)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_total=count_recipes(IngredientRecipe, 'ingredient'),
+        )
 
 
 @admin.register(Recipe)
@@ -36,13 +97,44 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (
         TagInline, IngredientInline,
     )
-    list_display = ('name', 'author', 'count_favorite')
-    list_filter = ('name', 'author', 'tags')
-    search_fields = ('name', 'author', 'tags')
+    list_display = ('name', 'author', 'pub_date', 'count_favorite')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', '=author__email', 'author__username')
+    raw_id_fields = ('author',)
+    date_hierarchy = 'pub_date'
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     readonly_fields = ('count_favorite',)
 
     def count_favorite(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     count_favorite.short_description = 'Добавили в избранное'
+    count_favorite.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        """Инлайны сохраняются без сигналов рецепта, поэтому маска
+        тегов и сводные списки покупок обновляются здесь."""
+        recipe = form.instance
+        before = get_recipe_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        update_tags_mask([recipe.pk])
+        if not change:
+            return
+        deltas = get_recipe_amounts(recipe)
+        for ingredient_id, amount in before.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        update_shopping_lists(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True,
+            ),
+            deltas,
+        )
+
+    def lookup_allowed(self, lookup, value):
+        # Ссылка из карточки ингредиента фильтрует по нему без list_filter,
+        # который перечислил бы все ингредиенты.
+        if lookup == INGREDIENT_LOOKUP:
+            return True
+        return super().lookup_allowed(lookup, value)
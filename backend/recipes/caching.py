@@ -0,0 +1,91 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from foodgram.caching import bump_version, get_version, is_shared_cache
+from foodgram.db_router import use_primary
+from recipes.models import Tag
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version():
+    """Версия справочников тегов и ингредиентов: время последнего
+    изменения в миллисекундах."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def _load_tags():
+    # Из основной базы: кэш живёт до следующей смены версии.
+    rows = Tag.objects.using(DEFAULT_DB_ALIAS).values_list(
+        'id', 'slug', 'bit',
+    )
+    return {slug: (tag_id, bit) for tag_id, slug, bit in rows}
+
+
+def get_tags_index():
+    """Теги в виде {slug: (id, bit)} для фильтра ленты без запроса
+    к базе; живёт до смены версии справочников. Без общего кэша
+    читаются из базы: смену версии видел бы только один процесс."""
+    if not is_shared_cache():
+        return _load_tags()
+    key = f'catalog:{get_catalog_version()}:tags'
+    tags = cache.get(key)
+    if tags is None:
+        tags = _load_tags()
+        cache.set(key, tags, CATALOG_CACHE_TIMEOUT)
+    return tags
+
+
+class CatalogCacheMixin:
+    """Отдаёт list и retrieve из кэша уже отрендеренными в JSON,
+    с сильным ETag и Last-Modified. Кэш сбрасывается сменой версии
+    справочников, поэтому повторные запросы не обращаются к базе.
+    Работает только с общим кэшем, иначе ответы строятся как обычно."""
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def cached_response(self, request, view, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json' or not is_shared_cache():
+            return view(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f'catalog:{version}:{path}'
+        cached = cache.get(key)
+        if cached is None:
+            with use_primary():
+                data = view(request, *args, **kwargs).data
+            content = renderer.render(
+                data, request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+            cached = (content, etag)
+            cache.set(key, cached, CATALOG_CACHE_TIMEOUT)
+
+        content, etag = cached
+        last_modified = version // 1000
+        response = HttpResponse(content, content_type=renderer.media_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept',))
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response,
+        )
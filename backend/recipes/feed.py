@@ -0,0 +1,160 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from recipes.models import Recipe, TimelineEntry
+from recipes.services import get_batch_size
+from users.models import Follow
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FANOUT_WORKERS = getattr(settings, 'FEED_FANOUT_WORKERS', 1)
+FANOUT_MAX_FOLLOWERS = getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 10000)
+FANOUT_BATCH_SIZE = getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+# Сколько последних рецептов автора попадает в ленту при подписке.
+SUBSCRIBE_BACKFILL = 100
+
+executor = (
+    ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='feed')
+    if FANOUT_WORKERS else None
+)
+
+
+def _make_entry(user_id, recipe):
+    return TimelineEntry(
+        user_id=user_id, recipe_id=recipe.id, author_id=recipe.author_id,
+        pub_date=recipe.pub_date,
+    )
+
+
+def is_fanned_out(author):
+    return author.followers_count <= FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_recipe(recipe):
+    """Раскладывает рецепт по лентам подписчиков автора пачками
+    по FANOUT_BATCH_SIZE, каждая пачка — отдельная вставка."""
+    author = User.objects.only('followers_count').get(pk=recipe.author_id)
+    if not is_fanned_out(author):
+        return
+    followers = Follow.objects.filter(author_id=author.id).order_by(
+        'user_id',
+    ).values_list('user_id', flat=True)
+    last_user_id = 0
+    while True:
+        batch = list(
+            followers.filter(user_id__gt=last_user_id)[:FANOUT_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(
+            (_make_entry(user_id, recipe) for user_id in batch),
+            ignore_conflicts=True,
+        )
+        last_user_id = batch[-1]
+
+
+def run_fan_out(recipe):
+    try:
+        fan_out_recipe(recipe)
+    except Exception:
+        logger.exception('Не удалось разложить рецепт %s по лентам', recipe.id)
+    finally:
+        connections.close_all()
+
+
+def schedule_fan_out(recipe):
+    """Ставит раскладку в пул потоков после коммита, чтобы создание
+    рецепта не ждало вставок в ленты подписчиков. Если процесс упадёт
+    раньше, ленты восстанавливает rebuild_timelines."""
+    if executor is None:
+        transaction.on_commit(lambda: fan_out_recipe(recipe))
+    else:
+        transaction.on_commit(lambda: executor.submit(run_fan_out, recipe))
+
+
+def add_author_to_timeline(user, author):
+    if not is_fanned_out(author):
+        return
+    recipes = Recipe.objects.filter(author=author).order_by(
+        '-pub_date', '-id',
+    ).only('id', 'author_id', 'pub_date')[:SUBSCRIBE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (_make_entry(user.id, recipe) for recipe in recipes),
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_timeline(user, author):
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def _get_keys(queryset, id_field, position, limit):
+    if position is not None:
+        pub_date, recipe_id = position
+        queryset = queryset.filter(pub_date__lte=pub_date).exclude(
+            pub_date=pub_date, **{f'{id_field}__gte': recipe_id}
+        )
+    return list(
+        queryset.order_by('-pub_date', f'-{id_field}').values_list(
+            'pub_date', id_field,
+        )[:limit]
+    )
+
+
+def get_feed_keys(user, position, limit):
+    """Ключи (pub_date, recipe_id) ленты подписок после position,
+    от новых к старым. Основной источник — диапазон индекса TimelineEntry;
+    рецепты авторов без fan-out дочитываются из Recipe и сливаются."""
+    keys = _get_keys(
+        TimelineEntry.objects.filter(user=user), 'recipe_id', position, limit,
+    )
+    large_authors = list(
+        Follow.objects.filter(
+            user=user, author__followers_count__gt=FANOUT_MAX_FOLLOWERS,
+        ).values_list('author_id', flat=True)
+    )
+    if large_authors:
+        keys += _get_keys(
+            Recipe.objects.filter(author_id__in=large_authors), 'id',
+            position, limit,
+        )
+        keys = sorted(set(keys), reverse=True)
+    return keys[:limit]
+
+
+def rebuild_timelines(users_id=None):
+    """Пересобирает ленты с нуля по подпискам; возвращает число записей."""
+    follows = Follow.objects.filter(
+        author__followers_count__lte=FANOUT_MAX_FOLLOWERS,
+        author__recipes__isnull=False,
+    )
+    timelines = TimelineEntry.objects.all()
+    if users_id is not None:
+        follows = follows.filter(user_id__in=users_id)
+        timelines = timelines.filter(user_id__in=users_id)
+    rows = follows.values_list(
+        'user_id', 'author__recipes__id', 'author_id',
+        'author__recipes__pub_date',
+    ).order_by()
+    with transaction.atomic():
+        timelines.delete()
+        entries = [
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id,
+                author_id=author_id, pub_date=pub_date,
+            )
+            for user_id, recipe_id, author_id, pub_date in rows.iterator()
+        ]
+        created = TimelineEntry.objects.bulk_create(
+            entries,
+            batch_size=get_batch_size(
+                TimelineEntry, entries, FANOUT_BATCH_SIZE,
+            ),
+        )
+    return len(created)
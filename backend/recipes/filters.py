@@ -1,7 +1,32 @@
-from django_filters import CharFilter, ModelMultipleChoiceFilter
+from django import forms
+from django.db.models import Exists, F, OuterRef
+from django_filters import CharFilter, ChoiceFilter, Filter
 from django_filters.rest_framework import FilterSet, BooleanFilter
 
-from recipes.models import Recipe, Tag, Ingredient
+from recipes.caching import get_tags_index
+from recipes.models import (
+    Recipe, TagRecipe, Ingredient, FavoriteRecipe, ShoppingCart,
+)
+from recipes.search import search_recipes
+
+TAGS_ANY = 'any'
+TAGS_ALL = 'all'
+TAGS_MODES = (
+    (TAGS_ANY, 'Хотя бы один из тегов'),
+    (TAGS_ALL, 'Все теги'),
+)
+
+
+class SlugListField(forms.Field):
+    """Список слагов из повторяющегося параметра, без дублей."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return list(dict.fromkeys(slug for slug in value or () if slug))
+
+
+class SlugListFilter(Filter):
+    field_class = SlugListField
 
 
 class IngredientFilter(FilterSet):
@@ -15,12 +40,10 @@ class IngredientFilter(FilterSet):
 class RecipeFilter(FilterSet):
     author = CharFilter()
     name = CharFilter()
+    search = CharFilter(method='filter_search')
 
-    tags = ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
-    )
+    tags = SlugListFilter(method='filter_tags')
+    tags_mode = ChoiceFilter(choices=TAGS_MODES, method='filter_tags_mode')
 
     is_favorited = BooleanFilter(
         field_name='is_favorited', method='filter',
@@ -30,22 +53,73 @@ class RecipeFilter(FilterSet):
     )
 
     def filter(self, queryset, name, value):
-        if name == 'is_in_shopping_cart' and value:
-            queryset = queryset.filter(
-                shopping_cart_item__user=self.request.user
-            )
-        if name == 'is_favorited' and value:
-            queryset = queryset.filter(
-                favorite_recipe__user=self.request.user
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        model = FavoriteRecipe if name == 'is_favorited' else ShoppingCart
+        related = model.objects.filter(user=user, recipe=OuterRef('pk'))
+        return queryset.annotate(
+            **{name: Exists(related)}
+        ).filter(**{name: True})
+
+    def filter_tags(self, queryset, name, slugs):
+        """Рецепты с любым (tags_mode=any) или всеми (tags_mode=all)
+        тегами. Если у всех тегов есть бит, это одно условие на маску
+        Recipe, иначе — EXISTS по TagRecipe; в обоих случаях без JOIN
+        и DISTINCT. Условие на маску индексом не покрывается: база идёт
+        по индексу (pub_date, id) и отбрасывает неподходящие строки, пока
+        не наберёт страницу, так что редкий тег читает больше строк.
+        Неизвестные слаги ничего не находят."""
+        if not slugs:
+            return queryset
+        match_all = self.form.cleaned_data.get('tags_mode') == TAGS_ALL
+        tags_index = get_tags_index()
+        tags = [tags_index[slug] for slug in slugs if slug in tags_index]
+        if not tags or (match_all and len(tags) < len(slugs)):
+            return queryset.none()
+
+        if all(bit is not None for _, bit in tags):
+            mask = 0
+            for _, bit in tags:
+                mask |= 1 << bit
+            queryset = queryset.annotate(
+                tags_matched=F('tags_mask').bitand(mask),
             )
+            if match_all:
+                return queryset.filter(tags_matched=mask)
+            return queryset.filter(tags_matched__gt=0)
+
+        related = TagRecipe.objects.filter(recipe=OuterRef('pk'))
+        if not match_all:
+            return queryset.annotate(
+                has_tags=Exists(
+                    related.filter(tag_id__in=[tag_id for tag_id, _ in tags])
+                ),
+            ).filter(has_tags=True)
+        for position, (tag_id, _) in enumerate(tags):
+            name = f'has_tag_{position}'
+            queryset = queryset.annotate(
+                **{name: Exists(related.filter(tag_id=tag_id))}
+            ).filter(**{name: True})
         return queryset
 
+    def filter_tags_mode(self, queryset, name, value):
+        # Режим читает filter_tags.
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = (
             'author',
             'name',
+            'search',
             'tags',
+            'tags_mode',
             'is_favorited',
             'is_in_shopping_cart',
         )
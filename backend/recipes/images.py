@@ -0,0 +1,128 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (144, 144),
+    'card': (726, 480),
+    'detail': (960, 960),
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', '.jpg', {'quality': 82, 'optimize': True}),
+    'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+}
+
+RENDITION_WORKERS = getattr(settings, 'IMAGE_RENDITION_WORKERS', 2)
+
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+
+executor = (
+    ThreadPoolExecutor(
+        max_workers=RENDITION_WORKERS, thread_name_prefix='renditions',
+    )
+    if RENDITION_WORKERS else None
+)
+
+
+def get_rendition_name(name, size, file_format):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{size}{FORMATS[file_format][1]}'
+
+
+def get_renditions(recipe):
+    """Карта размеров и форматов с адресами уменьшенных копий
+    или None, если копии для текущего изображения ещё не готовы."""
+    return get_renditions_by_name(recipe.image.name, recipe.image_renditions)
+
+
+def get_renditions_by_name(name, renditions):
+    """То же по имени файла и значению image_renditions из values()."""
+    if not name or renditions != name:
+        return None
+    return {
+        size: {
+            file_format: default_storage.url(
+                get_rendition_name(name, size, file_format)
+            )
+            for file_format in FORMATS
+        }
+        for size in RENDITIONS
+    }
+
+
+def _flatten(image):
+    """Убирает прозрачность для JPEG, подкладывая белый фон."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_renditions(name):
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    for size, dimensions in RENDITIONS.items():
+        resized = ImageOps.fit(image, dimensions, Image.LANCZOS)
+        for file_format, (pil_format, _, options) in FORMATS.items():
+            converted = _flatten(resized) if pil_format == 'JPEG' else resized
+            buffer = io.BytesIO()
+            converted.save(buffer, pil_format, **options)
+            rendition = get_rendition_name(name, size, file_format)
+            if default_storage.exists(rendition):
+                default_storage.delete(rendition)
+            default_storage.save(rendition, ContentFile(buffer.getvalue()))
+
+
+def generate_renditions(name):
+    """Строит копии и отмечает все рецепты с этим изображением.
+    Одно и то же изображение в процессе обрабатывается одним потоком."""
+    from recipes.models import Recipe
+    from recipes.representations import invalidate_recipes
+
+    with _in_progress_lock:
+        if name in _in_progress:
+            return
+        _in_progress.add(name)
+    try:
+        render_renditions(name)
+        recipes = Recipe.objects.filter(image=name)
+        recipes_id = list(recipes.values_list('id', flat=True))
+        recipes.update(image_renditions=name)
+        invalidate_recipes(recipes_id)
+    except Exception:
+        logger.exception('Не удалось построить копии изображения %s', name)
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(name)
+        if executor is not None:
+            connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """Ставит построение копий в пул потоков после коммита,
+    чтобы не задерживать запрос."""
+    if not recipe.image or recipe.image_renditions == recipe.image.name:
+        return
+    name = recipe.image.name
+    if executor is None:
+        transaction.on_commit(lambda: generate_renditions(name))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(generate_renditions, name)
+        )
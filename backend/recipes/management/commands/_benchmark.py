@@ -0,0 +1,23 @@
+import math
+
+
+def percentile(values, fraction):
+    """Перцентиль отсортированного списка методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(latencies, elapsed=None):
+    """Сводка по задержкам в секундах: перцентили в миллисекундах."""
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+    if elapsed:
+        summary['rps'] = round(len(latencies) / elapsed, 1)
+    return summary
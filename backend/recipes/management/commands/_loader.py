@@ -0,0 +1,148 @@
+import csv
+import io
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.caching import bump_catalog_version
+
+DATA_DIR = os.path.join(os.path.dirname(settings.BASE_DIR), 'data')
+# Не больше параметров в одном IN, чем допускают старые версии SQLite.
+KEY_LOOKUP_SIZE = 500
+
+
+class CSVLoadCommand(BaseCommand):
+    """Базовая команда для загрузки справочника из CSV без заголовка.
+    На PostgreSQL строки загружаются через COPY во временную таблицу
+    и переносятся INSERT ... ON CONFLICT DO NOTHING, на остальных базах
+    через bulk_create(ignore_conflicts=True). Повторный запуск безопасен:
+    уже существующие записи пропускаются."""
+    model = None
+    fields = ()
+    default_file = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(DATA_DIR, self.default_file),
+            help='Путь к CSV-файлу.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной пачке.',
+        )
+
+    def read_rows(self, path):
+        with open(path, encoding='utf-8', newline='') as csv_file:
+            for line_number, row in enumerate(csv.reader(csv_file), 1):
+                row = [value.strip() for value in row]
+                if len(row) != len(self.fields) or not all(row):
+                    self.stderr.write(
+                        f'Строка {line_number} пропущена: {row}'
+                    )
+                    continue
+                yield row
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        if batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+
+        rows = self.read_rows(path)
+        processed = 0
+        inserted = 0
+        started = time.perf_counter()
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                write_batch = self.copy_batch
+                self.create_temp_table()
+            else:
+                write_batch = self.bulk_create_batch
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                inserted += write_batch(batch)
+                processed += len(batch)
+                self.stdout.write(
+                    f'Обработано строк: {processed} '
+                    f'({self.rate(processed, started):.0f} строк/с)'
+                )
+        self.after_load()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.model._meta.verbose_name_plural}: добавлено {inserted} '
+            f'из {processed} '
+            f'за {elapsed:.3f} с ({self.rate(processed, started):.0f} строк/с)'
+        ))
+
+    @staticmethod
+    def rate(processed, started):
+        return processed / max(time.perf_counter() - started, 1e-9)
+
+    @property
+    def temp_table(self):
+        return f'{self.model._meta.db_table}_load'
+
+    def create_temp_table(self):
+        columns = ', '.join(self.fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {self.temp_table} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {self.model._meta.db_table} '
+                f'WITH NO DATA'
+            )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        columns = ', '.join(self.fields)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {self.temp_table} ({columns}) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM {self.temp_table} '
+                f'ON CONFLICT DO NOTHING'
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f'TRUNCATE {self.temp_table}')
+        return inserted
+
+    def count_existing(self, keys):
+        """Сколько строк пачки уже есть в таблице. Выбираются только
+        строки с тем же значением первого поля, а не вся таблица."""
+        first_values = list({key[0] for key in keys})
+        existing = set()
+        for start in range(0, len(first_values), KEY_LOOKUP_SIZE):
+            existing.update(
+                self.model.objects.filter(**{
+                    f'{self.fields[0]}__in':
+                        first_values[start:start + KEY_LOOKUP_SIZE],
+                }).values_list(*self.fields)
+            )
+        return len(existing & keys)
+
+    def bulk_create_batch(self, batch):
+        keys = set(map(tuple, batch))
+        before = self.count_existing(keys)
+        self.model.objects.bulk_create(
+            (self.model(**dict(zip(self.fields, row))) for row in batch),
+            ignore_conflicts=True,
+        )
+        return self.count_existing(keys) - before
+
+    def after_load(self):
+        """Сбрасывает кэши: bulk-вставки не отправляют сигналы."""
+        bump_catalog_version()
@@ -0,0 +1,150 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.commands._benchmark import summarize
+from recipes.models import Recipe
+
+SERVERS = {
+    'wsgi': (
+        '-m', 'gunicorn', 'foodgram.wsgi:application',
+        '--workers', '{workers}', '--bind', '127.0.0.1:{port}',
+        '--log-level', 'warning',
+    ),
+    'asgi': (
+        '-m', 'uvicorn', 'foodgram.asgi:application',
+        '--workers', '{workers}', '--host', '127.0.0.1', '--port', '{port}',
+        '--log-level', 'warning',
+    ),
+}
+START_TIMEOUT = 30
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронные воркеры gunicorn (WSGI) и uvicorn (ASGI) '
+        'с тем же числом процессов и той же конкурентностью клиентов '
+        'на эндпоинтах чтения. Запускать на заполненной локальной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--threads', type=int, default=16,
+            help='Потоков на процесс ASGI (ASGI_THREADS).',
+        )
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь для нагрузки; по умолчанию эндпоинты чтения.',
+        )
+        parser.add_argument(
+            '--token', help='Токен для путей, требующих авторизации.',
+        )
+        parser.add_argument(
+            '--server', choices=SERVERS, action='append', dest='servers',
+        )
+
+    def handle(self, *args, **options):
+        paths = [
+            quote(path, safe='/?&=')
+            for path in options['paths'] or self.get_default_paths(
+                options['token'],
+            )
+        ]
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        for name in options['servers'] or SERVERS:
+            port = get_free_port()
+            process = self.start(name, port, options)
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                self.wait_ready(process, base_url + paths[0])
+                result = self.load(base_url, paths, headers, options)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+            self.stdout.write(
+                f'{name}: ' + ', '.join(
+                    f'{key}={value}' for key, value in result.items()
+                )
+            )
+
+    @staticmethod
+    def get_default_paths(token):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError('Нет рецептов, заполните базу.')
+        paths = [
+            '/api/tags/',
+            '/api/ingredients/?name=мо',
+            '/api/recipes/',
+            f'/api/recipes/{recipe.id}/',
+        ]
+        if token:
+            paths.append('/api/users/subscriptions/')
+        return paths
+
+    @staticmethod
+    def start(name, port, options):
+        command = [sys.executable] + [
+            part.format(workers=options['workers'], port=port)
+            for part in SERVERS[name]
+        ]
+        environ = dict(os.environ, ASGI_THREADS=str(options['threads']))
+        return subprocess.Popen(command, cwd=settings.BASE_DIR, env=environ)
+
+    @staticmethod
+    def wait_ready(process, url):
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('Сервер завершился при запуске.')
+            try:
+                urllib.request.urlopen(url, timeout=5).read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('Сервер не поднялся за отведённое время.')
+
+    @staticmethod
+    def load(base_url, paths, headers, options):
+        def fetch(path):
+            request = urllib.request.Request(base_url + path, headers=headers)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                failed = False
+            except OSError:
+                failed = True
+            return time.perf_counter() - started, failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                fetch, islice(cycle(paths), options['requests']),
+            ))
+        elapsed = time.perf_counter() - started
+        summary = summarize(
+            [latency for latency, failed in results if not failed], elapsed,
+        )
+        summary['errors'] = sum(failed for _, failed in results)
+        return summary
@@ -0,0 +1,127 @@
+import re
+from itertools import combinations
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+
+from recipes.filters import RecipeFilter
+from recipes.models import (
+    FavoriteRecipe, IngredientRecipe, Recipe, ShoppingCart, Tag, TagRecipe,
+)
+from recipes.representations import get_recipe_rows
+
+User = get_user_model()
+
+FILTERS = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+CHECKED_MODELS = (
+    User, Recipe, TagRecipe, IngredientRecipe, FavoriteRecipe, ShoppingCart,
+)
+
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'(?:^|->)\s*Sort\s+\(cost=\S+ rows=(\d+)')
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(.*)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для всех сочетаний фильтров ленты рецептов '
+        'и падает, если на большой таблице встречается полный проход '
+        'или сортировка. Запускать на заполненной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='С какого числа строк таблица считается большой.',
+        )
+
+    def handle(self, *args, **options):
+        min_rows = options['min_rows']
+        large_tables = {
+            model._meta.db_table for model in CHECKED_MODELS
+            if model.objects.count() >= min_rows
+        }
+        if not large_tables:
+            raise CommandError(
+                f'Нет таблиц больше {min_rows} строк, заполните базу.'
+            )
+        self.stdout.write(
+            'Большие таблицы: {}'.format(', '.join(sorted(large_tables)))
+        )
+
+        failures = 0
+        for request in self.get_requests():
+            plan = self.explain(request)
+            problems = self.find_problems(plan, large_tables, min_rows)
+            title = request.GET.urlencode() or '(без фильтров)'
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL {title}'))
+                for problem in problems:
+                    self.stdout.write(f'    {problem}')
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK   {title}'))
+
+        if failures:
+            raise CommandError(f'Проблемных сочетаний фильтров: {failures}.')
+
+    @staticmethod
+    def get_requests():
+        user = User.objects.annotate(
+            favorites_total=Count('favorite_recipe'),
+        ).order_by('-favorites_total').first()
+        author = User.objects.order_by('-recipes_count').first()
+        values = {
+            'author': author.id,
+            'tags': list(Tag.objects.values_list('slug', flat=True)[:2]),
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+        factory = RequestFactory()
+        for size in range(len(FILTERS) + 1):
+            for names in combinations(FILTERS, size):
+                request = factory.get(
+                    '/api/recipes/', {name: values[name] for name in names},
+                )
+                request.user = user
+                yield request
+
+    @staticmethod
+    def explain(request):
+        """EXPLAIN первой страницы ленты так, как её строит
+        RecipeViewSet.list: фильтр и строки get_recipe_rows."""
+        queryset = get_recipe_rows(RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request,
+        ).qs)
+        return queryset[:settings.REST_FRAMEWORK['PAGE_SIZE']].explain()
+
+    @staticmethod
+    def find_problems(plan, large_tables, min_rows):
+        problems = []
+        for line in plan.splitlines():
+            if connection.vendor == 'postgresql':
+                scan = POSTGRES_SEQ_SCAN.search(line)
+                if scan and scan.group(1) in large_tables:
+                    problems.append(line.strip())
+                sort = POSTGRES_SORT.search(line)
+                if sort and int(sort.group(1)) >= min_rows:
+                    problems.append(line.strip())
+            elif connection.vendor == 'sqlite':
+                scan = SQLITE_SCAN.search(line)
+                if (
+                    scan and scan.group(1) in large_tables
+                    and 'USING' not in scan.group(2)
+                ):
+                    problems.append(line.strip())
+                if 'USE TEMP B-TREE' in line:
+                    problems.append(line.strip())
+            else:
+                raise CommandError(
+                    f'Планы для {connection.vendor} не поддерживаются.'
+                )
+        return problems
@@ -0,0 +1,115 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import Recipe
+from recipes.renderers import FastJSONRenderer
+from recipes.representations import invalidate_recipes, represent_recipes
+from recipes.serializers import RecipeSerializer
+from recipes.views import RecipeViewSet
+
+User = get_user_model()
+
+ORDERING = ('-pub_date', '-id')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет быстрое представление рецептов (represent_recipes + '
+        'FastJSONRenderer) с RecipeSerializer + JSONRenderer побайтно '
+        'для анонима и пользователя с избранным и списком покупок, '
+        'сначала с пустым кэшем представлений, затем из кэша. '
+        'При расхождении завершается с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200)
+        parser.add_argument(
+            '--user', help='Username; по умолчанию самый активный.',
+        )
+
+    def handle(self, *args, **options):
+        recipes_id = list(
+            Recipe.objects.order_by(*ORDERING).values_list('id', flat=True)[
+                :options['limit']
+            ]
+        )
+        if not recipes_id:
+            raise CommandError('В базе нет рецептов.')
+        failed = False
+        for user in (AnonymousUser(), self.get_user(options['user'])):
+            if user is None:
+                continue
+            failed |= not self.compare(recipes_id, user)
+        if failed:
+            raise CommandError('Представления расходятся.')
+        self.stdout.write(self.style.SUCCESS('Представления совпадают.'))
+
+    def get_user(self, username):
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.annotate(
+                activity=Count('favorite_recipe') + Count(
+                    'shopping_cart_item',
+                ),
+            ).order_by('-activity', 'id')
+        return users.first()
+
+    def get_context(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return {'request': request}
+
+    def compare(self, recipes_id, user):
+        queryset = RecipeViewSet().get_queryset().filter(
+            id__in=recipes_id,
+        ).order_by(*ORDERING)
+        started = time.perf_counter()
+        expected = JSONRenderer().render(RecipeSerializer(
+            queryset, many=True, context=self.get_context(user),
+        ).data)
+        serializer_time = time.perf_counter() - started
+
+        invalidate_recipes(recipes_id)
+        name = user.username or 'аноним'
+        passed = True
+        for stage in ('без кэша', 'из кэша'):
+            started = time.perf_counter()
+            actual = FastJSONRenderer().render(
+                represent_recipes(recipes_id, self.get_context(user)),
+            )
+            fast_time = time.perf_counter() - started
+            self.stdout.write(
+                f'{name}: {len(recipes_id)} рецептов, {len(expected)} байт; '
+                f'сериализатор {serializer_time * 1000:.1f} мс, '
+                f'быстрый путь {stage} {fast_time * 1000:.1f} мс.'
+            )
+            passed &= self.report(f'{name}, {stage}', actual, expected)
+        return passed
+
+    def report(self, name, actual, expected):
+        if actual == expected:
+            return True
+        position = next(
+            (
+                index
+                for index, (left, right) in enumerate(zip(actual, expected))
+                if left != right
+            ),
+            min(len(actual), len(expected)),
+        )
+        start = max(position - 80, 0)
+        self.stderr.write(
+            f'{name}: расхождение с байта {position}:\n'
+            f'  сериализатор: {expected[start:position + 80]!r}\n'
+            f'  быстрый путь: {actual[start:position + 80]!r}'
+        )
+        return False
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии изображений существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии и для уже обработанных рецептов.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Количество потоков.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.exclude(image_renditions=F('image'))
+        pending = list(
+            recipes.order_by().values_list('image', flat=True).distinct()
+        )
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for done, _ in enumerate(
+                executor.map(generate_renditions, pending), 1,
+            ):
+                self.stdout.write(f'Обработано {done} из {len(pending)}')
+
+        failed = Recipe.objects.filter(image__in=pending).exclude(
+            image_renditions=F('image'),
+        ).values('image').distinct().count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений готово: {len(pending) - failed}, '
+            f'с ошибками: {failed}.'
+        ))
@@ -0,0 +1,14 @@
+from recipes.management.commands._loader import CSVLoadCommand
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+
+class Command(CSVLoadCommand):
+    help = 'Загружает ингредиенты из CSV: название, единица измерения.'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_file = 'ingredients.csv'
+
+    def after_load(self):
+        super().after_load()
+        ingredient_index.invalidate()
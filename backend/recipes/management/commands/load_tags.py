@@ -0,0 +1,14 @@
+from recipes.management.commands._loader import CSVLoadCommand
+from recipes.models import Tag
+from recipes.services import assign_tag_bits
+
+
+class Command(CSVLoadCommand):
+    help = 'Загружает теги из CSV: название, цвет, слаг.'
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    default_file = 'tags.csv'
+
+    def after_load(self):
+        assign_tag_bits()
+        super().after_load()
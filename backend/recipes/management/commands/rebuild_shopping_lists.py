@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.services import get_batch_size, get_expected_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет сводные списки покупок с ShoppingCart '
+        'и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Проверить только этих пользователей (id).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        users_id = options['users']
+        with transaction.atomic():
+            if users_id is not None:
+                list(User.objects.select_for_update().filter(id__in=users_id))
+            expected = get_expected_shopping_lists(users_id)
+            items = ShoppingListItem.objects.all()
+            if users_id is not None:
+                items = items.filter(user_id__in=users_id)
+            actual = {
+                (item.user_id, item.ingredient_id): item
+                for item in items.iterator()
+            }
+
+            missing = [
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for (user_id, ingredient_id), amount in expected.items()
+                if (user_id, ingredient_id) not in actual
+            ]
+            extra = [
+                item.id for key, item in actual.items() if key not in expected
+            ]
+            changed = []
+            for key, item in actual.items():
+                if key in expected and item.amount != expected[key]:
+                    item.amount = expected[key]
+                    changed.append(item)
+
+            self.stdout.write(
+                f'Недостающих позиций: {len(missing)}, '
+                f'лишних: {len(extra)}, '
+                f'с неверным количеством: {len(changed)}.'
+            )
+            if options['dry_run']:
+                return
+            ShoppingListItem.objects.bulk_create(
+                missing,
+                batch_size=get_batch_size(ShoppingListItem, missing),
+            )
+            ShoppingListItem.objects.filter(id__in=extra).delete()
+            ShoppingListItem.objects.bulk_update(
+                changed, ('amount',), batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Сводные списки исправлены.'))
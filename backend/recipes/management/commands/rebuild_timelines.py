@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок по Follow: нужно, если fan-out '
+        'прервался или автор опустился ниже порога fan-out.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Пересобрать ленты только этих пользователей (id).',
+        )
+
+    def handle(self, *args, **options):
+        created = rebuild_timelines(options['users'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Записей в лентах: {created}.')
+        )
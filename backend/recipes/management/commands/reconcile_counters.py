@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (User, 'following_count', Follow, 'user'),
+)
+
+
+def get_actual_count(model, field):
+    """Подзапрос с реальным числом строк model для внешней записи."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики и исправляет дрейф.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        for model, counter, source, field in COUNTERS:
+            with transaction.atomic():
+                drifted = list(
+                    model.objects.annotate(
+                        actual=get_actual_count(source, field),
+                    ).exclude(**{counter: F('actual')}).values_list(
+                        'pk', flat=True,
+                    )
+                )
+                self.stdout.write(
+                    f'{model._meta.model_name}.{counter}: '
+                    f'расхождений {len(drifted)}.'
+                )
+                if drifted and not options['dry_run']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{counter: get_actual_count(source, field)},
+                    )
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены.'))
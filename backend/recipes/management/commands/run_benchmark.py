@@ -0,0 +1,188 @@
+import json
+import time
+from contextlib import ExitStack
+from statistics import mean
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands._benchmark import summarize
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes')
+
+
+class QueryCounter:
+    """Считает запросы ко всем базам через execute_wrapper."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные эндпоинты через тестовый клиент Django '
+        'внутри процесса и выводит JSON с p50/p95/p99, числом SQL-запросов '
+        'и размером ответа. С --baseline печатает разницу с прошлым '
+        'прогоном. Запускать на базе после seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user',
+            help='Username пользователя для авторизованных запросов; '
+                 'по умолчанию самый активный.',
+        )
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints',
+            help='Запустить только эндпоинты с этими именами.',
+        )
+        parser.add_argument('--output', help='Записать результат в файл.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого прогона для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {
+            False: Client(),
+            True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+        }
+        endpoints = self.get_endpoints()
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - set(endpoints)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные эндпоинты: {", ".join(sorted(unknown))}.'
+                )
+            endpoints = {
+                name: endpoints[name] for name in options['endpoints']
+            }
+
+        results = {}
+        for name, (path, authenticated) in endpoints.items():
+            results[name] = self.measure(
+                clients[authenticated], path,
+                options['iterations'], options['warmup'],
+            )
+        report = {
+            'iterations': options['iterations'],
+            'user': user.username,
+            'recipes': Recipe.objects.count(),
+            'endpoints': results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['baseline']:
+            self.compare(options['baseline'], results)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден.')
+            return user
+        user = User.objects.annotate(
+            activity=Count('shopping_cart_item', distinct=True),
+        ).filter(following_count__gt=0).order_by('-activity', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей с подписками, сначала '
+                'выполните seed_benchmark.'
+            )
+        return user
+
+    def get_endpoints(self):
+        """Имя → (путь, нужна ли авторизация). Параметры берутся
+        из данных, чтобы фильтры и поиск что-то находили."""
+        recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов.')
+        tags = list(
+            Tag.objects.annotate(usage=Count('tagrecipe'))
+            .order_by('-usage', 'id').values_list('slug', flat=True)[:2]
+        )
+        tags_query = '&'.join(f'tags={slug}' for slug in tags)
+        word = recipe.name.split()[-1]
+        return {
+            'tags': ('/api/tags/', False),
+            'ingredients_search': ('/api/ingredients/?name=сах', False),
+            'recipes_anonymous': ('/api/recipes/', False),
+            'recipes': ('/api/recipes/', True),
+            'recipes_page_10': ('/api/recipes/?page=10', True),
+            'recipes_tags': (f'/api/recipes/?{tags_query}', True),
+            'recipes_favorited': ('/api/recipes/?is_favorited=1', True),
+            'recipes_search': (f'/api/recipes/?search={word}', True),
+            'recipe_detail': (f'/api/recipes/{recipe.id}/', True),
+            'feed': ('/api/recipes/feed/', True),
+            'subscriptions': ('/api/users/subscriptions/', True),
+            'download_shopping_cart': (
+                '/api/recipes/download_shopping_cart/', True,
+            ),
+        }
+
+    def request(self, client, path, counter):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            started = time.perf_counter()
+            response = client.get(path)
+            if response.streaming:
+                size = sum(map(len, response.streaming_content))
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, size
+
+    def measure(self, client, path, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, path, QueryCounter())
+        latencies, queries, sizes, statuses = [], [], [], set()
+        for _ in range(iterations):
+            counter = QueryCounter()
+            status, elapsed, size = self.request(client, path, counter)
+            latencies.append(elapsed)
+            queries.append(counter.count)
+            sizes.append(size)
+            statuses.add(status)
+        result = summarize(latencies)
+        result.update(
+            path=path,
+            status=sorted(statuses),
+            queries=round(mean(queries), 1),
+            bytes=round(mean(sizes)),
+        )
+        return result
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['endpoints']
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            changes = []
+            for key in COMPARED:
+                before, after = baseline[name][key], result[key]
+                if before == after:
+                    continue
+                ratio = f' ({after / before - 1:+.0%})' if before else ''
+                changes.append(f'{key}: {before} → {after}{ratio}')
+            self.stderr.write(
+                f'{name}: {"; ".join(changes) or "без изменений"}'
+            )
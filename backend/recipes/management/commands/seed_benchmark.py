@@ -0,0 +1,240 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag,
+    TagRecipe,
+)
+from recipes.services import get_batch_size
+from users.models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+UNITS_AMOUNT = (1, 500)
+WORDS = (
+    'домашний', 'быстрый', 'пряный', 'летний', 'сырный', 'овощной',
+    'куриный', 'томатный', 'сливочный', 'ореховый', 'яблочный', 'постный',
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'рагу', 'плов', 'соус', 'десерт',
+    'паста', 'запеканка', 'каша', 'бульон',
+)
+
+
+def zipf_weights(count, exponent):
+    """Веса 1/rank^exponent: немногие элементы получают большую часть."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные для бенчмарков: пользователей, '
+        'рецепты с ингредиентами из data/ingredients.csv и тегами, '
+        'избранное, списки покупок и подписки с перекосом популярности. '
+        'Всё вставляется пачками, счётчики и производные таблицы '
+        'пересчитываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=int, default=None,
+            help='Всего рецептов; по умолчанию 3 на пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=4,
+            help='Среднее число рецептов в списке покупок.',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'укажите другой --prefix.'
+            )
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', verbosity=0)
+        if not Tag.objects.exists():
+            call_command('load_tags', verbosity=0)
+
+        started = time.perf_counter()
+        users_id = self.create_users(prefix, options['users'])
+        recipes_id = self.create_recipes(
+            users_id, options['recipes'] or options['users'] * 3,
+        )
+        self.create_relations(
+            FavoriteRecipe, 'recipe_id', users_id, recipes_id,
+            options['favorites'],
+        )
+        self.create_relations(
+            ShoppingCart, 'recipe_id', users_id, recipes_id, options['carts'],
+        )
+        self.create_relations(
+            Follow, 'author_id', users_id, users_id, options['follows'],
+        )
+        self.step('Пересчёт производных данных')
+        for command in (
+            'reconcile_counters', 'rebuild_shopping_lists',
+            'rebuild_timelines',
+        ):
+            call_command(command, verbosity=0, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с. '
+            f'Пароль пользователей: {PASSWORD}.'
+        ))
+
+    def insert(self, model, rows, **kwargs):
+        model.objects.bulk_create(
+            rows, batch_size=get_batch_size(model, rows, self.batch_size),
+            **kwargs,
+        )
+
+    def step(self, message):
+        self.stdout.write(f'{message}...')
+
+    def pick(self, population, weights, count):
+        """Неповторяющиеся элементы с учётом весов популярности."""
+        count = min(count, len(population))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.random.choices(
+                population, cum_weights=weights, k=count - len(chosen),
+            ))
+        return chosen
+
+    def sample_count(self, mean):
+        """Число связей пользователя: экспоненциальное вокруг mean."""
+        return int(self.random.expovariate(1 / mean)) if mean else 0
+
+    def create_users(self, prefix, count):
+        self.step(f'Пользователи: {count}')
+        password = make_password(PASSWORD)
+        self.insert(User, [
+            User(
+                email=f'{prefix}_{number}@example.com',
+                username=f'{prefix}_{number}',
+                first_name='Имя', last_name='Фамилия', password=password,
+            )
+            for number in range(count)
+        ])
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_')
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_recipes(self, users_id, count):
+        self.step(f'Рецепты: {count}')
+        authors = list(users_id)
+        self.random.shuffle(authors)
+        author_weights = zipf_weights(len(authors), self.skew)
+        first_id = (
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+            .first() or 0
+        )
+        self.insert(Recipe, [
+            Recipe(
+                author_id=author_id,
+                name=(
+                    f'{self.random.choice(WORDS).capitalize()} '
+                    f'{self.random.choice(DISHES)}'
+                ),
+                text=' '.join(self.random.choices(WORDS + DISHES, k=40)),
+                cooking_time=self.random.randint(5, 180),
+                image='images/benchmark.jpg',
+            )
+            for author_id in self.random.choices(
+                authors, cum_weights=author_weights, k=count,
+            )
+        ])
+        recipes = list(
+            Recipe.objects.filter(id__gt=first_id).order_by('id')
+            .only('id', 'pub_date')
+        )
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                seconds=self.random.randint(0, 365 * 24 * 60 * 60),
+            )
+        Recipe.objects.bulk_update(
+            recipes, ('pub_date',), batch_size=self.batch_size,
+        )
+        self.create_composition([recipe.id for recipe in recipes])
+        return [recipe.id for recipe in recipes]
+
+    def create_composition(self, recipes_id):
+        self.step('Ингредиенты и теги рецептов')
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        ingredient_weights = zipf_weights(len(ingredients), 0.8)
+        self.random.shuffle(ingredients)
+        tags = list(Tag.objects.values_list('id', 'bit'))
+        ingredient_rows = []
+        tag_rows = []
+        masks = []
+        for recipe_id in recipes_id:
+            for ingredient_id in self.pick(
+                ingredients, ingredient_weights,
+                round(self.random.triangular(3, 15, 7)),
+            ):
+                ingredient_rows.append(IngredientRecipe(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=self.random.randint(*UNITS_AMOUNT),
+                ))
+            mask = 0
+            for tag_id, bit in self.random.sample(
+                tags, min(self.random.randint(1, 3), len(tags)),
+            ):
+                tag_rows.append(TagRecipe(recipe_id=recipe_id, tag_id=tag_id))
+                if bit is not None:
+                    mask |= 1 << bit
+            masks.append(Recipe(id=recipe_id, tags_mask=mask))
+        self.insert(IngredientRecipe, ingredient_rows)
+        self.insert(TagRecipe, tag_rows)
+        Recipe.objects.bulk_update(
+            masks, ('tags_mask',), batch_size=self.batch_size,
+        )
+
+    def create_relations(self, model, target_field, users_id, targets, mean):
+        targets = list(targets)
+        self.random.shuffle(targets)
+        weights = zipf_weights(len(targets), self.skew)
+        rows = []
+        for user_id in users_id:
+            chosen = self.pick(targets, weights, self.sample_count(mean))
+            if target_field == 'author_id':
+                chosen.discard(user_id)
+            rows.extend(
+                model(user_id=user_id, **{target_field: target_id})
+                for target_id in chosen
+            )
+        self.step(f'{model._meta.verbose_name_plural}: {len(rows)}')
+        self.insert(model, rows, ignore_conflicts=True)
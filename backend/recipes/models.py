@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
@@ -30,6 +31,11 @@ class Tag(models.Model):
         verbose_name='Слаг',
     )
 
+    bit = models.PositiveSmallIntegerField(
+        null=True, unique=True, editable=False,
+        verbose_name='Бит в маске тегов рецепта',
+    )
+
     class Meta:
         ordering = ('slug',)
         verbose_name = 'Тег'
@@ -54,6 +60,12 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -79,6 +91,11 @@ class Recipe(models.Model):
         verbose_name='Изображение рецепта',
     )
 
+    image_renditions = models.CharField(
+        max_length=100, blank=True, editable=False,
+        verbose_name='Изображение, для которого построены копии',
+    )
+
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -103,8 +120,42 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
     )
 
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Добавили в избранное',
+    )
+
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Добавили в список покупок',
+    )
+
+    tags_mask = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name='Маска тегов',
+    )
+
+    search_vector = SearchVectorField(
+        null=True, editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['name'],
+                name='recipe_name_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -162,6 +213,12 @@ class TagRecipe(models.Model):
                 name='unique_tag_recipe',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'tag'],
+                name='tagrecipe_recipe_tag_idx',
+            ),
+        ]
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
 
@@ -209,3 +266,70 @@ class ShoppingCart(models.Model):
         ]
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок: сумма ингредиента по всем рецептам
+    из списка покупок пользователя. Поддерживается инкрементально."""
+    objects = models.Manager()
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            )
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} для {self.user}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя. Заполняется при публикации
+    рецепта (fan-out on write); рецепты авторов с очень большим числом
+    подписчиков сюда не попадают и читаются из Recipe при запросе."""
+    objects = models.Manager()
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline',
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -0,0 +1,119 @@
+import base64
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, CursorPagination, PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов по (pub_date, id)."""
+    ordering = ('-pub_date', '-id')
+
+
+class UserCursorPagination(CursorPagination):
+    ordering = ('-id',)
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """Постраничная пагинация, которая переключается на курсорную,
+    если в запросе есть параметр cursor (на первой странице пустой).
+    Курсорная не считает COUNT(*) и не сканирует OFFSET, поэтому
+    глубокие страницы отдаются так же быстро, как первая."""
+    cursor_pagination_class = None
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view,
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+
+class RecipePagination(OptionalCursorPagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class UserPagination(OptionalCursorPagination):
+    cursor_pagination_class = UserCursorPagination
+
+
+class FeedCursorPagination(BasePagination):
+    """Курсорная пагинация ленты подписок. Курсор — ключ (pub_date, id)
+    последнего рецепта страницы, поэтому следующая страница читается
+    диапазоном индекса, без OFFSET. Источник — функция
+    get_keys(position, limit), которая может сливать несколько выборок."""
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_feed(self, get_keys, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = get_keys(self.decode_cursor(request), page_size + 1)
+        self.next_position = keys[page_size - 1] if (
+            len(keys) > page_size
+        ) else None
+        return [recipe_id for _, recipe_id in keys[:page_size]]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, recipe_id = base64.urlsafe_b64decode(
+                encoded.encode('ascii'),
+            ).decode('ascii').split(' ')
+            position = (parse_datetime(pub_date), int(recipe_id))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        pub_date, recipe_id = self.next_position
+        encoded = base64.urlsafe_b64encode(
+            f'{pub_date.isoformat()} {recipe_id}'.encode('ascii'),
+        ).decode('ascii')
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            encoded,
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
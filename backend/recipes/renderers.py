@@ -0,0 +1,55 @@
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson. Вывод побайтно совпадает с компактным
+    JSON из JSONRenderer: даты, Decimal и ленивые строки orjson отдаёт
+    кодировщику DRF, а U+2028/U+2029 экранируются так же.
+    С отступами и ASCII-выводом работает обычный JSONRenderer."""
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(
+            accepted_media_type, renderer_context or {},
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context,
+            )
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options,
+        )
+        return ret.replace(LINE_SEPARATOR, b'\\u2028').replace(
+            PARAGRAPH_SEPARATOR, b'\\u2029',
+        )
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Рендерер для выгрузки в формате .txt.
+    Используется для сообщений об ошибках, сам файл отдаётся потоком."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Рендерер для выгрузки в формате .csv."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+SHOPPING_CART_RENDERERS = (PlainTextRenderer, CSVRenderer, FastJSONRenderer)
@@ -0,0 +1,179 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from foodgram.caching import bump_version, get_versions, is_shared_cache
+from foodgram.metrics import timed_serialization
+from recipes.caching import get_catalog_version
+from recipes.images import get_renditions_by_name
+from recipes.models import IngredientRecipe, Recipe, TagRecipe
+from users.relations import FAVORITES, SHOPPING_CART, has_relation
+
+RECIPE_FIELDS = (
+    'id', 'pub_date', 'name', 'image', 'image_renditions', 'text',
+    'cooking_time',
+)
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+# Поля представления до и после флагов пользователя, в порядке
+# RecipeSerializer.
+BASE_HEAD_FIELDS = ('id', 'tags', 'author', 'ingredients')
+BASE_TAIL_FIELDS = ('name', 'image', 'images', 'text', 'cooking_time')
+# Меняется вместе с форматом представления, чтобы не читать старые записи.
+REPRESENTATION_VERSION = 1
+
+
+def get_recipe_rows(queryset):
+    """Ключи страницы для represent_recipes: сами представления берутся
+    из кэша. pub_date нужен курсорной пагинации."""
+    return queryset.values('id', 'pub_date')
+
+
+def get_recipes_tags(recipes_id):
+    tags = defaultdict(list)
+    rows = TagRecipe.objects.using(DEFAULT_DB_ALIAS).filter(
+        recipe_id__in=recipes_id,
+    ).order_by('tag__slug').values_list(
+        'recipe_id', *(f'tag__{field}' for field in TAG_FIELDS),
+    )
+    for recipe_id, *values in rows:
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+    return tags
+
+
+def get_recipes_ingredients(recipes_id):
+    ingredients = defaultdict(list)
+    rows = IngredientRecipe.objects.using(DEFAULT_DB_ALIAS).filter(
+        recipe_id__in=recipes_id,
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount',
+    )
+    for recipe_id, *values in rows:
+        ingredients[recipe_id].append(dict(zip(INGREDIENT_FIELDS, values)))
+    return ingredients
+
+
+def build_base_representations(recipes_id):
+    """Общая для всех пользователей часть представления: всё, кроме
+    is_favorited и is_in_shopping_cart. Читается из основной базы,
+    чтобы отставшая реплика не вернула в кэш старую версию."""
+    rows = Recipe.objects.using(DEFAULT_DB_ALIAS).filter(
+        id__in=recipes_id,
+    ).values(
+        *RECIPE_FIELDS, *(f'author__{field}' for field in AUTHOR_FIELDS),
+    )
+    tags = get_recipes_tags(recipes_id)
+    ingredients = get_recipes_ingredients(recipes_id)
+    return {
+        row['id']: {
+            'id': row['id'],
+            'tags': tags[row['id']],
+            'author': {
+                field: row[f'author__{field}'] for field in AUTHOR_FIELDS
+            },
+            'ingredients': ingredients[row['id']],
+            'name': row['name'],
+            'image': (
+                default_storage.url(row['image']) if row['image'] else None
+            ),
+            'images': get_renditions_by_name(
+                row['image'], row['image_renditions'],
+            ),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+        for row in rows
+    }
+
+
+def _get_version_key(recipe_id):
+    return f'recipe:{recipe_id}:version'
+
+
+def _get_key(catalog_version, recipe_id, recipe_version):
+    return (
+        f'recipe:{REPRESENTATION_VERSION}:{catalog_version}:'
+        f'{recipe_id}:{recipe_version}'
+    )
+
+
+def get_base_representations(recipes_id):
+    """Базовые представления одним cache.get_many на страницу;
+    недостающие строятся тремя запросами и кладутся в кэш.
+    В ключе версия справочников, общая для всех рецептов, и версия
+    самого рецепта: запись, опоздавшая после изменения, ложится
+    под ключ, который уже никто не читает. Без общего кэша
+    представления строятся на каждый запрос: смену версии видел бы
+    только один процесс."""
+    if not is_shared_cache():
+        return build_base_representations(recipes_id)
+    catalog_version = get_catalog_version()
+    version_keys = {
+        recipe_id: _get_version_key(recipe_id) for recipe_id in recipes_id
+    }
+    versions = get_versions(version_keys.values())
+    keys = {
+        recipe_id: _get_key(catalog_version, recipe_id, versions[key])
+        for recipe_id, key in version_keys.items()
+    }
+    cached = cache.get_many(keys.values())
+    representations = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+    missing = [
+        recipe_id for recipe_id in keys if recipe_id not in representations
+    ]
+    if missing:
+        built = build_base_representations(missing)
+        cache.set_many(
+            {
+                keys[recipe_id]: representation
+                for recipe_id, representation in built.items()
+            },
+            settings.RECIPE_CACHE_SECONDS,
+        )
+        representations.update(built)
+    return representations
+
+
+def invalidate_recipes(recipes_id):
+    """Меняет версии рецептов после коммита."""
+    recipes_id = list(recipes_id)
+    if not recipes_id or not is_shared_cache():
+        return
+
+    def invalidate():
+        for recipe_id in recipes_id:
+            bump_version(_get_version_key(recipe_id))
+
+    transaction.on_commit(invalidate)
+
+
+@timed_serialization
+def represent_recipes(recipes_id, context):
+    """Тот же JSON, что RecipeSerializer(many=True).data, в порядке
+    recipes_id: базовые представления из кэша плюс флаги пользователя.
+    Отсутствующие рецепты пропускаются. Только для чтения."""
+    representations = get_base_representations(recipes_id)
+    result = []
+    for recipe_id in recipes_id:
+        base = representations.get(recipe_id)
+        if base is None:
+            continue
+        representation = {field: base[field] for field in BASE_HEAD_FIELDS}
+        representation['is_favorited'] = has_relation(
+            context, FAVORITES, recipe_id,
+        )
+        representation['is_in_shopping_cart'] = has_relation(
+            context, SHOPPING_CART, recipe_id,
+        )
+        for field in BASE_TAIL_FIELDS:
+            representation[field] = base[field]
+        result.append(representation)
+    return result
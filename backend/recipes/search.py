@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Q
+
+from recipes.models import Ingredient, Recipe
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+INDEX_TTL = 300
+
+WORD_SEPARATOR = re.compile(r'[\s,;:()«»"/\-]+')
+SEARCH_WORD = re.compile(r'\w+')
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Совпадение в названии весит больше, как вес 'A' против 'B' в PostgreSQL.
+FTS_NAME_WEIGHT = 2.5
+# FTS5 не приравнивает «ё» к «е», поэтому индекс хранит текст с заменой.
+FTS_FOLD = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+FTS_VALUES = ', '.join(
+    FTS_FOLD.format(f'{{0}}{column}') for column in ('name', 'text')
+)
+FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, {FTS_VALUES.format('new.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, {FTS_VALUES.format('new.')});
+    END
+    """,
+)
+
+Snapshot = namedtuple(
+    'Snapshot', ('generation', 'built_at', 'items', 'names', 'words'),
+)
+
+
+def normalize(value):
+    return value.lower().replace('ё', 'е').strip()
+
+
+def _scan_prefix(keys, query):
+    """Возвращает индексы ключей, начинающихся с query, по порядку."""
+    position = bisect_left(keys, (query,))
+    while position < len(keys) and keys[position][0].startswith(query):
+        yield keys[position][1]
+        position += 1
+
+
+class IngredientIndex:
+    """Индекс в памяти процесса для автодополнения ингредиентов.
+    Сначала отдаёт совпадения по началу названия, затем по началу
+    любого следующего слова. Перестраивается лениво: после изменения
+    ингредиентов в этом процессе или по истечении INDEX_TTL секунд,
+    чтобы подхватывать изменения из других процессов."""
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._snapshot = None
+
+    def invalidate(self):
+        self._generation += 1
+
+    def _is_fresh(self, snapshot):
+        return (
+            snapshot is not None
+            and snapshot.generation == self._generation
+            and time.monotonic() - snapshot.built_at < self.ttl
+        )
+
+    def _build(self):
+        generation = self._generation
+        items = tuple(
+            Ingredient.objects.using(DEFAULT_DB_ALIAS).order_by(
+                'name', 'id',
+            ).values(
+                'id', 'name', 'measurement_unit',
+            )
+        )
+        names = []
+        words = []
+        for position, item in enumerate(items):
+            name = normalize(item['name'])
+            names.append((name, position))
+            for word in WORD_SEPARATOR.split(name)[1:]:
+                if word:
+                    words.append((word, position))
+        names.sort()
+        words.sort()
+        return Snapshot(
+            generation, time.monotonic(), items, tuple(names), tuple(words),
+        )
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        with self._lock:
+            if not self._is_fresh(self._snapshot):
+                self._snapshot = self._build()
+            return self._snapshot
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        query = normalize(query)
+        if not query:
+            return []
+        snapshot = self.get_snapshot()
+        found = []
+        seen = set()
+        for keys in (snapshot.names, snapshot.words):
+            for position in _scan_prefix(keys, query):
+                if position in seen:
+                    continue
+                seen.add(position)
+                found.append(position)
+                if len(found) >= limit:
+                    return [snapshot.items[i] for i in found]
+        return [snapshot.items[i] for i in found]
+
+
+ingredient_index = IngredientIndex()
+
+
+def ensure_fts_table(connection):
+    """Создаёт на SQLite FTS5-индекс рецептов и триггеры синхронизации.
+    Схема-редактор SQLite пересоздаёт таблицу при любом изменении
+    и теряет её триггеры, поэтому вызывается после каждого migrate;
+    недостающие триггеры восстанавливаются с перестроением индекса."""
+    if connection.vendor != 'sqlite':
+        return
+    if Recipe._meta.db_table not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND tbl_name = 'recipes_recipe' "
+            "AND name LIKE %s",
+            (f'{FTS_TABLE}_%',),
+        )
+        if cursor.fetchone()[0] == len(FTS_TRIGGERS):
+            return
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(name, text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        for trigger in FTS_TRIGGERS:
+            cursor.execute(trigger)
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f"SELECT id, {FTS_VALUES.format('')} FROM recipes_recipe"
+        )
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск по названию и описанию с ранжированием.
+    PostgreSQL ищет по search_vector (GIN), SQLite — по FTS5-таблице."""
+    words = SEARCH_WORD.findall(normalize(query))
+    if not words:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(' '.join(words), config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        )
+    elif vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        table = Recipe._meta.db_table
+        # Соединение с FTS-таблицей: MATCH выполняется один раз, а bm25()
+        # считается для найденных строк. Коррелированный подзапрос
+        # повторял бы MATCH для каждого рецепта.
+        queryset = queryset.extra(
+            select={
+                'search_rank':
+                    f'-bm25({FTS_TABLE}, {FTS_NAME_WEIGHT}, 1.0)',
+            },
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = {table}.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[match],
+        )
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition)
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
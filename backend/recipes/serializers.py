@@ -1,14 +1,21 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes.images import get_renditions
 from recipes.models import (
-    Tag, Ingredient, Recipe, IngredientRecipe,
-    TagRecipe, ShoppingCart, FavoriteRecipe,
+    Tag, Ingredient, Recipe, IngredientRecipe, TagRecipe, ShoppingCart,
 )
+from recipes.representations import invalidate_recipes
+from recipes.services import update_shopping_lists, update_tags_mask
+from users.relations import FAVORITES, SHOPPING_CART, has_relation
 
 User = get_user_model()
 
+MAX_AMOUNT = 32767
+MAX_BATCH_SIZE = 500
+
 
 class AuthorSerializer(serializers.ModelSerializer):
     """Сериализатор для автора рецепта."""
@@ -95,88 +102,208 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     name = serializers.CharField(required=True)
     image = Base64ImageField(required=True)
+    images = serializers.SerializerMethodField()
     text = serializers.CharField(required=True)
     cooking_time = serializers.IntegerField(min_value=1, max_value=1000)
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = (
+            'pub_date', 'image_renditions', 'favorites_count',
+            'in_carts_count', 'tags_mask', 'search_vector',
+        )
+
+    def get_images(self, data):
+        return get_renditions(data)
 
     def get_is_favorited(self, data):
-        request = self.context.get('request')
-        user = request.user
-        if user.is_authenticated:
-            return (
-                FavoriteRecipe.objects.filter(
-                    user=user, recipe=data,
-                ).exists()
-            )
-        return False
+        return has_relation(self.context, FAVORITES, data.id)
 
     def get_is_in_shopping_cart(self, data):
-        request = self.context.get('request')
-        user = request.user
-        if user.is_authenticated:
-            return (
-                ShoppingCart.objects.filter(user=user, recipe=data).exists()
+        return has_relation(self.context, SHOPPING_CART, data.id)
+
+    @staticmethod
+    def parse_ingredients(ingredients):
+        if not isinstance(ingredients, list) or not ingredients:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один ингредиент.'
+            )
+        amounts = {}
+        try:
+            for ingredient in ingredients:
+                ingredient_id = int(ingredient['id'])
+                amount = int(ingredient['amount'])
+                if ingredient_id in amounts:
+                    raise serializers.ValidationError(
+                        'Ингредиенты не должны повторяться.'
+                    )
+                if not 1 <= amount <= MAX_AMOUNT:
+                    raise serializers.ValidationError(
+                        f'Количество должно быть от 1 до {MAX_AMOUNT}.'
+                    )
+                amounts[ingredient_id] = amount
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Ингредиент задаётся как {"id": ..., "amount": ...}.'
             )
-        return False
+        existing = set(
+            Ingredient.objects.filter(
+                id__in=amounts,
+            ).values_list('id', flat=True)
+        )
+        if len(existing) != len(amounts):
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: {}.'.format(
+                    ', '.join(map(str, sorted(amounts.keys() - existing)))
+                )
+            )
+        return amounts
+
+    @staticmethod
+    def parse_tags(tags):
+        if not isinstance(tags, list) or not tags:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один тег.'
+            )
+        try:
+            tags_id = {int(tag_id) for tag_id in tags}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Тег задаётся своим id.')
+        existing = set(
+            Tag.objects.filter(id__in=tags_id).values_list('id', flat=True)
+        )
+        if len(existing) != len(tags_id):
+            raise serializers.ValidationError(
+                'Теги не найдены: {}.'.format(
+                    ', '.join(map(str, sorted(tags_id - existing)))
+                )
+            )
+        return tags_id
 
+    def validate(self, data):
+        request = self.context.get('request')
+        for field, parser in (
+            ('ingredients', self.parse_ingredients),
+            ('tags', self.parse_tags),
+        ):
+            value = request.data.get(field)
+            if value is None:
+                if self.instance is None:
+                    raise serializers.ValidationError(
+                        {field: 'Обязательное поле.'}
+                    )
+                continue
+            try:
+                data[field] = parser(value)
+            except serializers.ValidationError as error:
+                raise serializers.ValidationError({field: error.detail})
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
+        ingredients = validated_data.pop('ingredients')
+        tags_id = validated_data.pop('tags')
 
-        user = User.objects.get(pk=request.user.pk)
-        ingredients = request.data.get('ingredients')
-        tags_id = request.data.get('tags')
-
-        recipe = Recipe.objects.create(author=user, **validated_data)
+        recipe = Recipe.objects.create(author=request.user, **validated_data)
 
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(
-                id=ingredient.get('id')
-            )
-            IngredientRecipe.objects.create(
-                ingredient=current_ingredient,
-                recipe=recipe,
-                amount=ingredient.get('amount')
-            )
-
-        for tag_id in tags_id:
-            current_tag = Tag.objects.get(id=tag_id)
-            TagRecipe.objects.create(
-                tag=current_tag,
-                recipe=recipe,
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount,
             )
+            for ingredient_id, amount in ingredients.items()
+        )
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id) for tag_id in tags_id
+        )
+        update_tags_mask([recipe.id])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        request = self.context.get('request')
-
-        ingredients = request.data.get('ingredients')
-        tags_id = request.data.get('tags')
-
-        if ingredients:
-            IngredientRecipe.objects.filter(recipe=instance).delete()
-            for ingredient in ingredients:
-                current_ingredient, _ = Ingredient.objects.get_or_create(
-                    id=ingredient.get('id'),
-                )
-                IngredientRecipe.objects.create(
-                    ingredient=current_ingredient,
-                    recipe=instance,
-                    amount=ingredient.get('amount'),
-                )
+        ingredients = validated_data.pop('ingredients', None)
+        tags_id = validated_data.pop('tags', None)
+
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags_id is not None:
+            self.update_tags(instance, tags_id)
+
+        # Сохраняем только пришедшие поля, чтобы не затереть счётчики
+        # и маску тегов, которые обновляются отдельными UPDATE.
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=validated_data.keys())
+        # bulk-операции и save() без полей не шлют сигналов.
+        invalidate_recipes([instance.id])
+        return instance
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Применяет к рецепту только разницу между старым
+        и новым набором ингредиентов. Строки перечитываются под
+        блокировкой: параллельные правки одного рецепта иначе считали бы
+        разницу для списков покупок от одних и тех же старых количеств."""
+        rows = IngredientRecipe.objects.select_for_update().filter(
+            recipe=recipe,
+        ).order_by('id')
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in rows
+        }
+        deltas = {
+            ingredient_id: -recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        for ingredient_id, amount in ingredients.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        update_shopping_lists(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True,
+            ),
+            deltas,
+        )
 
-        if tags_id:
-            TagRecipe.objects.filter(recipe=instance).delete()
-            for tag_id in tags_id:
-                current_tag = Tag.objects.get(id=tag_id)
-                TagRecipe.objects.create(
-                    tag=current_tag,
-                    recipe=instance,
-                )
+        removed = current.keys() - ingredients.keys()
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed,
+            ).delete()
+
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = ingredients.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id,
+                amount=ingredients[ingredient_id],
+            )
+            for ingredient_id in ingredients.keys() - current.keys()
+        )
 
-        return super().update(instance, validated_data)
+    @staticmethod
+    def update_tags(recipe, tags_id):
+        """Применяет к рецепту только разницу между старым
+        и новым набором тегов."""
+        current = {tag.id for tag in recipe.tags.all()}
+        if current == tags_id:
+            return
+        removed = current - tags_id
+        if removed:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=removed,
+            ).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for tag_id in tags_id - current
+        )
+        update_tags_mask([recipe.id])
 
     def to_representation(self, instance):
         response = super(RecipeSerializer, self).to_representation(instance)
@@ -197,10 +324,28 @@ class RecipeMinimizedSerializer(serializers.ModelSerializer):
 
     image = Base64ImageField(required=True)
 
+    images = serializers.SerializerMethodField()
+
     cooking_time = serializers.CharField(
         read_only=True,
     )
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
+    def get_images(self, data):
+        return get_renditions(data)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного изменения избранного
+    и списка покупок."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
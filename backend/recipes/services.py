@@ -1,39 +1,347 @@
-from django.http import HttpResponse
+import csv
+import json
+from collections import defaultdict
+from sqlite3 import sqlite_version_info
 
-from recipes.models import ShoppingCart
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Sum, Value, When, Window,
+)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 
+from recipes.models import (
+    FavoriteRecipe, IngredientRecipe, Recipe, ShoppingCart, ShoppingListItem,
+    Tag, TagRecipe,
+)
+from users.relations import (
+    FAVORITES, SHOPPING_CART, add_relations, remove_relations,
+)
 
-def export_shopping_cart(user):
-    """Метод, позволяющий экспортировать список покупок в формат .txt."""
-    shopping_cart = ShoppingCart.objects.filter(user=user).all()
-    ingredients_list = dict()
+User = get_user_model()
 
-    for item in shopping_cart:
-        for recipe_ingredient in item.recipe.recipe_ingredients.all():
-            name = recipe_ingredient.ingredient.name
-            measurement_unit = recipe_ingredient.ingredient.measurement_unit
-            amount = recipe_ingredient.amount
+# Знаковый бит BigIntegerField не используем: маска всегда неотрицательна.
+TAG_BITS = 63
 
-            if name not in ingredients_list:
-                ingredients_list[name] = {
-                    'measurement_unit': measurement_unit,
-                    'amount': amount,
-                }
-            else:
-                ingredients_list[name]['amount'] += amount
+RECIPE_RELATIONS = {
+    FAVORITES: (FavoriteRecipe, 'favorites_count'),
+    SHOPPING_CART: (ShoppingCart, 'in_carts_count'),
+}
 
-    filename = 'shopping-list.txt'
-    content = ''
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
 
-    for ingredient in ingredients_list:
-        content += (
-            f'{ingredient} '
-            f'({ingredients_list[ingredient]["measurement_unit"]}) '
-            f'— {ingredients_list[ingredient]["amount"]}\n'
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+    def write(self, value):
+        return value
+
+
+def get_batch_size(model, objs, limit=1000):
+    """Размер пачки bulk_create не больше, чем примет СУБД: Django 2.2
+    не ограничивает явный batch_size, а SQLite отвергает длинный
+    INSERT ... SELECT UNION ALL."""
+    fields = model._meta.concrete_fields
+    return max(min(limit, connection.ops.bulk_batch_size(fields, objs)), 1)
+
+
+def get_shopping_cart_ingredients(user):
+    """Читает уже просуммированный список покупок пользователя."""
+    return (
+        ShoppingListItem.objects
+        .filter(user=user, amount__gt=0)
+        .values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        )
+        .order_by('name', 'measurement_unit')
+    )
+
+
+def get_recipe_amounts(recipe):
+    return dict(
+        IngredientRecipe.objects.filter(recipe=recipe).values_list(
+            'ingredient_id', 'amount',
+        )
+    )
+
+
+def update_shopping_lists(users_id, deltas):
+    """Прибавляет deltas ({ingredient_id: количество}) к сводным спискам
+    покупок пользователей. Строки пользователей блокируются, чтобы
+    параллельные изменения одного списка не теряли друг друга."""
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+    users_id = list(
+        User.objects.select_for_update().filter(
+            id__in=list(users_id),
+        ).order_by('id').values_list('id', flat=True)
+    )
+    if not users_id:
+        return
+
+    items = ShoppingListItem.objects.filter(
+        user_id__in=users_id, ingredient_id__in=deltas,
+    )
+    existing = set(items.values_list('user_id', 'ingredient_id'))
+    if existing:
+        items.update(amount=F('amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(delta))
+                for ingredient_id, delta in deltas.items()
+            ),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=delta,
+        )
+        for user_id in users_id
+        for ingredient_id, delta in deltas.items()
+        if delta > 0 and (user_id, ingredient_id) not in existing
+    )
+    items.filter(amount__lte=0).delete()
+
+
+def get_recipes_amounts(recipes_id, sign=1):
+    """Суммарные количества ингредиентов нескольких рецептов."""
+    return {
+        row['ingredient_id']: sign * row['total']
+        for row in IngredientRecipe.objects.filter(
+            recipe_id__in=recipes_id,
+        ).values('ingredient_id').annotate(total=Sum('amount')).order_by()
+    }
+
+
+def add_recipes(relation, user, recipes_id, fields=('id',)):
+    """Добавляет рецепты в избранное или список покупок пользователя.
+    Возвращает найденные рецепты (только fields) и id добавленных;
+    уже добавленные и несуществующие рецепты пропускаются."""
+    model, counter = RECIPE_RELATIONS[relation]
+    with transaction.atomic():
+        # Блокировка пользователя выстраивает его параллельные запросы
+        # в очередь: проверка «уже добавлен» и счётчики не разойдутся.
+        list(User.objects.select_for_update().filter(
+            pk=user.pk,
+        ).values_list('pk'))
+        recipes = list(
+            Recipe.objects.filter(id__in=recipes_id).annotate(
+                linked=Exists(model.objects.filter(
+                    user_id=user.pk, recipe_id=OuterRef('pk'),
+                )),
+            ).only(*fields)
+        )
+        added = [recipe.id for recipe in recipes if not recipe.linked]
+        if added:
+            model.objects.bulk_create(
+                (model(user_id=user.pk, recipe_id=pk) for pk in added),
+                ignore_conflicts=True,
+            )
+            Recipe.objects.filter(id__in=added).update(
+                **{counter: F(counter) + 1}
+            )
+            if relation == SHOPPING_CART:
+                update_shopping_lists([user.pk], get_recipes_amounts(added))
+        add_relations(user, relation, added)
+    return recipes, added
+
+
+def _delete_returning(model, user_id, recipes_id):
+    """DELETE ... RETURNING recipe_id: удаляет связи одним запросом
+    и сообщает, какие из них действительно были."""
+    queryset = model.objects.filter(user_id=user_id, recipe_id__in=recipes_id)
+    if not (
+        connection.vendor == 'postgresql'
+        or (connection.vendor == 'sqlite' and sqlite_version_info >= (3, 35))
+    ):
+        removed = list(queryset.values_list('recipe_id', flat=True))
+        queryset.delete()
+        return removed
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipes_id))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote("user_id")} = %s '
+            f'AND {quote("recipe_id")} IN ({placeholders}) '
+            f'RETURNING {quote("recipe_id")}',
+            [user_id, *recipes_id],
+        )
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+def remove_recipes(relation, user, recipes_id):
+    """Убирает рецепты из избранного или списка покупок пользователя.
+    Возвращает id тех, что там действительно были."""
+    model, counter = RECIPE_RELATIONS[relation]
+    recipes_id = list(recipes_id)
+    with transaction.atomic():
+        removed = _delete_returning(model, user.pk, recipes_id)
+        if removed:
+            Recipe.objects.filter(id__in=removed).update(
+                **{counter: F(counter) - 1}
+            )
+            if relation == SHOPPING_CART:
+                update_shopping_lists(
+                    [user.pk], get_recipes_amounts(removed, sign=-1),
+                )
+        remove_relations(user, relation, removed)
+    return removed
+
+
+def get_expected_shopping_lists(users_id=None):
+    """Пересчитывает сводные списки покупок с нуля из ShoppingCart."""
+    carts = ShoppingCart.objects.filter(
+        recipe__recipe_ingredients__isnull=False,
+    )
+    if users_id is not None:
+        carts = carts.filter(user_id__in=users_id)
+    totals = carts.values(
+        'user_id',
+        ingredient_id=F('recipe__recipe_ingredients__ingredient_id'),
+    ).annotate(
+        total=Sum('recipe__recipe_ingredients__amount'),
+    ).order_by()
+    return {
+        (row['user_id'], row['ingredient_id']): row['total']
+        for row in totals.iterator()
+    }
+
+
+def get_free_tag_bits():
+    used = set(
+        Tag.objects.filter(bit__isnull=False).values_list('bit', flat=True)
+    )
+    return [bit for bit in range(TAG_BITS) if bit not in used]
+
+
+def update_tags_mask(recipes_id):
+    """Пересчитывает маски тегов рецептов по TagRecipe."""
+    masks = dict.fromkeys(recipes_id, 0)
+    rows = TagRecipe.objects.filter(
+        recipe_id__in=masks, tag__bit__isnull=False,
+    ).values_list('recipe_id', 'tag__bit')
+    for recipe_id, bit in rows:
+        masks[recipe_id] |= 1 << bit
+    Recipe.objects.bulk_update(
+        (
+            Recipe(id=recipe_id, tags_mask=mask)
+            for recipe_id, mask in masks.items()
+        ),
+        ('tags_mask',),
+        batch_size=1000,
+    )
+
+
+def assign_tag_bits():
+    """Раздаёт свободные биты тегам без бита, например после
+    bulk-загрузки, и пересчитывает маски их рецептов. Тегам сверх
+    TAG_BITS бита не хватит: их фильтр работает через EXISTS."""
+    tags = list(Tag.objects.filter(bit__isnull=True).order_by('id'))
+    assigned = []
+    for tag, bit in zip(tags, get_free_tag_bits()):
+        tag.bit = bit
+        assigned.append(tag)
+    Tag.objects.bulk_update(assigned, ('bit',))
+    update_tags_mask(set(
+        TagRecipe.objects.filter(tag__in=assigned).values_list(
+            'recipe_id', flat=True,
         )
+    ))
+    return len(assigned)
 
-    response = HttpResponse(content, content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename={0}'.format(
-        filename
+
+def clear_tag_bit(bit):
+    """Снимает бит удалённого тега со всех масок."""
+    Recipe.objects.annotate(
+        tag_bit=F('tags_mask').bitand(1 << bit),
+    ).filter(tag_bit__gt=0).update(
+        tags_mask=F('tags_mask').bitand(~(1 << bit)),
+    )
+
+
+def _render_txt(ingredients):
+    for item in ingredients:
+        yield (
+            f'{item["name"]} '
+            f'({item["measurement_unit"]}) '
+            f'— {item["amount"]}\n'
+        )
+
+
+def _render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['amount'])
+        )
+
+
+def _render_json(ingredients):
+    separator = ''
+    yield '['
+    for item in ingredients:
+        yield separator + json.dumps({
+            'name': item['name'],
+            'measurement_unit': item['measurement_unit'],
+            'amount': item['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+RENDERERS = {
+    'txt': _render_txt,
+    'csv': _render_csv,
+    'json': _render_json,
+}
+
+
+def export_shopping_cart(user, file_format='txt'):
+    """Метод, позволяющий экспортировать список покупок
+    в формат .txt, .csv или .json."""
+    ingredients = get_shopping_cart_ingredients(user).iterator()
+    response = StreamingHttpResponse(
+        RENDERERS[file_format](ingredients),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping-list.{file_format}'
     )
     return response
+
+
+def get_recipes_previews(authors_id, limit):
+    """Возвращает не более limit последних рецептов каждого автора
+    одним запросом с ROW_NUMBER() OVER (PARTITION BY author_id)."""
+    previews = defaultdict(list)
+    if not authors_id:
+        return previews
+    ranked = Recipe.objects.filter(author_id__in=authors_id).annotate(
+        recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )
+    ).order_by()
+    sql, params = ranked.query.sql_with_params()
+    recipes = Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked '
+        f'WHERE recipe_rank <= %s ORDER BY author_id, recipe_rank',
+        (*params, limit),
+    )
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    return previews
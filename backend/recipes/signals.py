@@ -0,0 +1,124 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from recipes.caching import bump_catalog_version
+from recipes.feed import schedule_fan_out
+from recipes.images import schedule_renditions
+from recipes.models import (
+    Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag, TagRecipe,
+)
+from recipes.representations import AUTHOR_FIELDS, invalidate_recipes
+from recipes.search import ensure_fts_table, ingredient_index
+from recipes.services import (
+    clear_tag_bit, get_free_tag_bits, get_recipe_amounts,
+    update_shopping_lists,
+)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(instance, **kwargs):
+    if instance._state.adding and instance.bit is None:
+        free_bits = get_free_tag_bits()
+        if free_bits:
+            instance.bit = free_bits[0]
+
+
+@receiver(post_delete, sender=Tag)
+def release_tag_bit(instance, **kwargs):
+    if instance.bit is not None:
+        clear_tag_bit(instance.bit)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(**kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_renditions(instance, **kwargs):
+    schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_to_timelines(instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_representation(instance, **kwargs):
+    invalidate_recipes([instance.id])
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def invalidate_recipe_relations(instance, **kwargs):
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    """Данные автора входят в представления его рецептов. Сохранения,
+    не задевающие эти поля (например, last_login), пропускаются."""
+    if created or (
+        update_fields and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1,
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_lists(instance, **kwargs):
+    """Вычитает удаляемый рецепт из сводных списков покупок,
+    пока каскад ещё не удалил его из ShoppingCart."""
+    update_shopping_lists(
+        ShoppingCart.objects.filter(recipe=instance).values_list(
+            'user_id', flat=True,
+        ),
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_recipe_amounts(instance).items()
+        },
+    )
+
+
+@receiver(post_migrate)
+def create_fts_table(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        ensure_fts_table(connections[using])
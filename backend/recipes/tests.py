@@ -0,0 +1,133 @@
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag,
+    TagRecipe,
+)
+from recipes.renderers import FastJSONRenderer
+from recipes.representations import represent_recipes
+from recipes.serializers import RecipeSerializer
+from recipes.views import RecipeViewSet
+
+User = get_user_model()
+
+
+class RecipeRepresentationTest(TestCase):
+    """Быстрый путь represent_recipes + FastJSONRenderer должен отдавать
+    побайтно тот же JSON, что RecipeSerializer + JSONRenderer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Анна', last_name='"Кавычки" \\ и слеш',
+            password='password',
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Иван', last_name='Читатель', password='password',
+        )
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Ужин', '#8775D2', 'dinner'),
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (
+                ('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт.'),
+                ('соль', 'по вкусу'),
+            )
+        ]
+        full = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Смешать\nи жарить 🥞',
+            cooking_time=30, image='images/pancakes.jpg',
+        )
+        Recipe.objects.filter(pk=full.pk).update(
+            image_renditions='images/pancakes.jpg',
+        )
+        # Ингредиенты не по порядку id, теги не по порядку слагов.
+        for ingredient, amount in zip(reversed(ingredients), (1, 3, 500, 250)):
+            IngredientRecipe.objects.create(
+                recipe=full, ingredient=ingredient, amount=amount,
+            )
+        for tag in tags:
+            TagRecipe.objects.create(recipe=full, tag=tag)
+
+        without_image = Recipe.objects.create(
+            author=cls.reader, name='Чай', text='Заварить.', cooking_time=5,
+            image='',
+        )
+        IngredientRecipe.objects.create(
+            recipe=without_image, ingredient=ingredients[1], amount=50,
+        )
+        TagRecipe.objects.create(recipe=without_image, tag=tags[1])
+
+        bare = Recipe.objects.create(
+            author=cls.author, name='Вода', text='Налить.', cooking_time=1,
+            image='images/water.png',
+        )
+
+        FavoriteRecipe.objects.create(user=cls.reader, recipe=full)
+        ShoppingCart.objects.create(user=cls.reader, recipe=full)
+        ShoppingCart.objects.create(user=cls.reader, recipe=bare)
+        cls.recipes_id = [full.id, without_image.id, bare.id]
+
+    def get_context(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return {'request': request}
+
+    def assertSameJSON(self, user):
+        queryset = RecipeViewSet().get_queryset().filter(
+            id__in=self.recipes_id,
+        ).order_by('id')
+        expected = JSONRenderer().render(RecipeSerializer(
+            queryset, many=True, context=self.get_context(user),
+        ).data)
+        actual = FastJSONRenderer().render(
+            represent_recipes(self.recipes_id, self.get_context(user)),
+        )
+        self.assertEqual(actual, expected)
+
+    def test_anonymous(self):
+        self.assertSameJSON(AnonymousUser())
+
+    def test_authenticated(self):
+        self.assertSameJSON(self.reader)
+
+    def test_missing_recipes_are_skipped(self):
+        representations = represent_recipes(
+            [0, self.recipes_id[1]], self.get_context(AnonymousUser()),
+        )
+        self.assertEqual(
+            [representation['id'] for representation in representations],
+            [self.recipes_id[1]],
+        )
+
+    def test_shared_cache(self):
+        """С общим кэшем повторный вызов не ходит в базу и отдаёт то же."""
+        with TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            },
+        }):
+            context = self.get_context(AnonymousUser())
+            cold = represent_recipes(self.recipes_id, context)
+            with self.assertNumQueries(0):
+                warm = represent_recipes(self.recipes_id, context)
+            cache.clear()
+        self.assertEqual(warm, cold)
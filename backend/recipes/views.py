@@ -1,24 +1,50 @@
-from django.shortcuts import get_object_or_404
+from functools import partial
+
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import (
+    IsAuthenticated, IsAuthenticatedOrReadOnly,
+)
 from rest_framework.response import Response
 
+from recipes.caching import CatalogCacheMixin
+from recipes.feed import get_feed_keys
 from recipes.filters import RecipeFilter, IngredientFilter
-from recipes.models import (
-    Tag, Ingredient, Recipe, FavoriteRecipe,
-    ShoppingCart,
-)
+from recipes.models import Tag, Ingredient, Recipe, IngredientRecipe
+from recipes.pagination import FeedCursorPagination, RecipePagination
 from recipes.permissions import IsAuthorOrReadOnly
+from recipes.representations import get_recipe_rows, represent_recipes
+from recipes.renderers import SHOPPING_CART_RENDERERS
+from recipes.search import (
+    MAX_SEARCH_LIMIT, SEARCH_LIMIT, ingredient_index,
+)
 from recipes.serializers import (
     TagSerializer, IngredientSerializer,
-    RecipeSerializer, RecipeMinimizedSerializer,
+    RecipeSerializer, RecipeMinimizedSerializer, RecipeIdsSerializer,
+)
+from recipes.services import add_recipes, export_shopping_cart, remove_recipes
+from users.relations import FAVORITES, SHOPPING_CART
+
+RELATION_MESSAGES = {
+    FAVORITES: {
+        'exists': 'Рецепт уже есть в избранном.',
+        'missing': 'Рецепт не был в избранном.',
+    },
+    SHOPPING_CART: {
+        'exists': 'Рецепт уже есть в списке покупок.',
+        'missing': 'Рецепт не был в списке покупок.',
+    },
+}
+# Поля для RecipeMinimizedSerializer, включая нужное для images.
+MINIMIZED_FIELDS = (
+    'id', 'name', 'image', 'image_renditions', 'cooking_time',
 )
-from recipes.services import export_shopping_cart
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -26,7 +52,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -34,54 +60,128 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_LIMIT))
+        except ValueError:
+            limit = SEARCH_LIMIT
+        limit = min(max(limit, 1), MAX_SEARCH_LIMIT)
+        return Response(ingredient_index.search(name, limit))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Представление для рецептов, избранного и списка покупок."""
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient',
+                ).order_by('id'),
+            ),
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(Recipe.objects.all())
+        page = self.paginate_queryset(get_recipe_rows(queryset))
+        return self.get_paginated_response(represent_recipes(
+            [row['id'] for row in page], self.get_serializer_context(),
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Рецепт из кэша отдаётся без обращения к базе.
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise NotFound
+        representations = represent_recipes(
+            [pk], self.get_serializer_context(),
+        )
+        if not representations:
+            raise NotFound
+        return Response(representations[0])
+
+    def perform_create(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk,
+        )
+
+    def perform_update(self, serializer):
+        self.perform_create(serializer)
+
     def get_serializer_class(self):
         if self.action in ('favorite', 'shopping_cart'):
             return RecipeMinimizedSerializer
+        if self.action in ('favorite_batch', 'shopping_cart_batch'):
+            return RecipeIdsSerializer
         return RecipeSerializer
 
-    @action(
-        detail=True,
-        methods=['POST', 'DELETE'],
-        permission_classes=[IsAuthenticatedOrReadOnly],
-    )
-    def favorite(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-
+    def change_relation(self, request, pk, relation):
+        """Добавляет или убирает один рецепт: при добавлении проверка,
+        вставка и счётчик укладываются в четыре запроса, при удалении —
+        в два (DELETE ... RETURNING и счётчик)."""
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound
         if request.method == 'POST':
-            favorite_recipe, created = FavoriteRecipe.objects.get_or_create(
-                user=user, recipe=recipe,
+            recipes, added = add_recipes(
+                relation, request.user, [pk], fields=MINIMIZED_FIELDS,
             )
-            if not created:
+            if not recipes:
+                raise NotFound
+            if not added:
                 return Response(
-                    {'detail': 'Рецепт уже есть в избранном.'},
+                    {'detail': RELATION_MESSAGES[relation]['exists']},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-
-            serializer = self.get_serializer(favorite_recipe.recipe)
+            serializer = self.get_serializer(recipes[0])
             return Response(data=serializer.data, status=status.HTTP_200_OK)
 
-        if request.method == 'DELETE':
-            is_favorite_recipe_exists = FavoriteRecipe.objects.filter(
-                user=user, recipe=recipe,
-            ).exists()
-            if not is_favorite_recipe_exists:
-                return Response(
-                    {'detail': 'Рецепт не был в избранном.'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            FavoriteRecipe.objects.filter(
-                user=user, recipe=recipe,
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not remove_recipes(relation, request.user, [pk]):
+            if not Recipe.objects.filter(pk=pk).exists():
+                raise NotFound
+            return Response(
+                {'detail': RELATION_MESSAGES[relation]['missing']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def change_relations(self, request, relation):
+        """Пакетная версия: {"recipes": [id, ...]}. Уже добавленные,
+        отсутствующие и несуществующие рецепты пропускаются."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes_id = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            recipes, added = add_recipes(relation, request.user, recipes_id)
+            found = {recipe.id for recipe in recipes}
+            return Response({
+                'added': added,
+                'not_found': [pk for pk in recipes_id if pk not in found],
+            })
+        return Response({
+            'removed': remove_recipes(relation, request.user, recipes_id),
+        })
+
+    @action(
+        detail=True,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticatedOrReadOnly],
+    )
+    def favorite(self, request, pk):
+        return self.change_relation(request, pk, FAVORITES)
 
     @action(
         detail=True,
@@ -89,46 +189,48 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticatedOrReadOnly],
     )
     def shopping_cart(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+        return self.change_relation(request, pk, SHOPPING_CART)
 
-        if request.method == 'POST':
-            shopping_cart_item, created = ShoppingCart.objects.get_or_create(
-                user=user, recipe=recipe,
-            )
-            if not created:
-                return Response(
-                    {'detail': 'Рецепт уже есть в списке покупок.'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        permission_classes=[IsAuthenticated],
+    )
+    def favorite_batch(self, request):
+        return self.change_relations(request, FAVORITES)
 
-            serializer = self.get_serializer(shopping_cart_item.recipe)
-            return Response(data=serializer.data, status=status.HTTP_200_OK)
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart_batch(self, request):
+        return self.change_relations(request, SHOPPING_CART)
 
-        if request.method == 'DELETE':
-            is_favorite_recipe_exists = ShoppingCart.objects.filter(
-                user=user, recipe=recipe,
-            ).exists()
-            if not is_favorite_recipe_exists:
-                return Response(
-                    {'detail': 'Рецепт не был в списке покупок.'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            ShoppingCart.objects.filter(
-                user=user, recipe=recipe,
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        paginator = FeedCursorPagination()
+        recipes_id = paginator.paginate_feed(
+            partial(get_feed_keys, request.user), request,
+        )
+        return paginator.get_paginated_response(represent_recipes(
+            recipes_id, self.get_serializer_context(),
+        ))
 
     @action(
         detail=False,
         methods=['GET'],
-        permission_classes=[IsAuthenticatedOrReadOnly],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        try:
-            return export_shopping_cart(request.user)
-        except:
-            return Response(
-                {'detail': 'Извините, не получилось :(\nПовторите позднее.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return export_shopping_cart(
+            request.user, request.accepted_renderer.format,
+        )
@@ -8,17 +8,24 @@ User = get_user_model()
 
 @admin.register(User)
 class AllFieldsRequiredUserAdmin(admin.ModelAdmin):
-    list_display = ('email', 'username', 'first_name', 'last_name')
-    list_filter = ('email', 'username')
+    list_display = (
+        'email', 'username', 'first_name', 'last_name', 'recipes_count',
+        'followers_count',
+    )
+    list_filter = ('is_active', 'is_staff')
     list_per_page = 10
-    search_fields = ('email', 'search_fields')
+    search_fields = ('^email', '^username')
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
     list_per_page = 10
-    search_fields = ('user', 'author')
+    search_fields = ('=user__email', '=author__email')
+    raw_id_fields = ('user', 'author')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
@@ -0,0 +1,65 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.caching import is_shared_cache
+
+TOKEN_CACHE_TIMEOUT = getattr(settings, 'AUTH_TOKEN_CACHE_SECONDS', 300)
+TOKEN_CACHE_ALIAS = getattr(settings, 'AUTH_TOKEN_CACHE', 'default')
+
+
+def get_token_cache():
+    """Кэш токенов или None, если настроенный кэш не общий
+    для процессов: тогда токены каждый раз читаются из базы."""
+    # С кэшем в памяти процесса удалённый токен работал бы в других
+    # воркерах до истечения кэша.
+    if not is_shared_cache(TOKEN_CACHE_ALIAS):
+        return None
+    return caches[TOKEN_CACHE_ALIAS]
+
+
+def _get_key(token_key):
+    return 'auth_token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def invalidate_tokens(tokens_key):
+    """Сбрасывает кэш токенов после коммита, чтобы параллельный запрос
+    не успел положить в кэш ещё не изменённого пользователя."""
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return
+    keys = [_get_key(token_key) for token_key in tokens_key]
+    if keys:
+        transaction.on_commit(lambda: token_cache.delete_many(keys))
+
+
+def invalidate_user_tokens(user):
+    if get_token_cache() is None:
+        return
+    invalidate_tokens(
+        Token.objects.filter(user_id=user.pk).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который кэширует токен вместе с пользователем
+    на AUTH_TOKEN_CACHE_SECONDS, если кэш AUTH_TOKEN_CACHE общий для
+    процессов; иначе работает как обычный TokenAuthentication. Кэш
+    сбрасывается при удалении токена
+    (выход) и при любом save() пользователя: смене пароля, деактивации,
+    правке профиля. Каждый запрос получает свою копию пользователя
+    из кэша, поэтому request.user не делится между запросами."""
+    def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return super().authenticate_credentials(key)
+        cache_key = _get_key(key)
+        token = token_cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(cache_key, token, TOKEN_CACHE_TIMEOUT)
+        return token.user, token
@@ -31,6 +31,21 @@ class AllFieldsRequiredUser(AbstractUser):
         verbose_name='Пароль',
     )
 
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Количество рецептов',
+    )
+
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Количество подписчиков',
+    )
+
+    following_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Количество подписок',
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
         'username', 'first_name', 'last_name', 'password',
@@ -74,6 +89,12 @@ class Follow(models.Model):
                 name='unique_follow',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from foodgram.caching import bump_version, get_version, is_shared_cache
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Follow
+
+RELATIONS_TIMEOUT = 60 * 15
+
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+FOLLOWING = 'following'
+
+RELATIONS = {
+    FAVORITES: (FavoriteRecipe, 'recipe_id'),
+    SHOPPING_CART: (ShoppingCart, 'recipe_id'),
+    FOLLOWING: (Follow, 'author_id'),
+}
+
+
+def _get_version_key(user_id, relation):
+    return f'relations:{user_id}:{relation}:version'
+
+
+def _get_key(user_id, relation, version):
+    return f'relations:{user_id}:{relation}:{version}'
+
+
+def _load(user_id, relation):
+    model, field = RELATIONS[relation]
+    return set(
+        model.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_id,
+        ).values_list(field, flat=True)
+    )
+
+
+def get_relation_ids(user, relation):
+    """Множество id рецептов или авторов, связанных с пользователем.
+    Загружается из базы один раз и дальше живёт в общем кэше до
+    изменения. Версия множества входит в ключ: запись меняет версию,
+    и набор, прочитанный из базы до коммита, ложится под ключ, который
+    уже никто не читает. Без общего кэша множество читается из базы
+    на каждый запрос: смену версии видел бы только один процесс."""
+    if not is_shared_cache():
+        return _load(user.id, relation)
+    version = get_version(_get_version_key(user.id, relation))
+    key = _get_key(user.id, relation, version)
+    ids = cache.get(key)
+    if ids is None:
+        ids = _load(user.id, relation)
+        cache.set(key, ids, RELATIONS_TIMEOUT)
+    return ids
+
+
+def _invalidate(user, relation, targets_id):
+    """Меняет версию множества после коммита. Множество не правится
+    на месте: два параллельных изменения потеряли бы одно из них."""
+    if list(targets_id) and is_shared_cache():
+        key = _get_version_key(user.id, relation)
+        transaction.on_commit(lambda: bump_version(key))
+
+
+def add_relations(user, relation, targets_id):
+    _invalidate(user, relation, targets_id)
+
+
+def remove_relations(user, relation, targets_id):
+    _invalidate(user, relation, targets_id)
+
+
+def add_relation(user, relation, target_id):
+    add_relations(user, relation, [target_id])
+
+
+def remove_relation(user, relation, target_id):
+    remove_relations(user, relation, [target_id])
+
+
+def has_relation(context, relation, target_id):
+    """Проверяет связь текущего пользователя из контекста сериализатора.
+    Множество запоминается в контексте, чтобы на всю страницу
+    хватило одного обращения к кэшу."""
+    request = context.get('request')
+    if request is None or not request.user.is_authenticated:
+        return False
+    loaded = context.setdefault('relations', {})
+    if relation not in loaded:
+        loaded[relation] = get_relation_ids(request.user, relation)
+    return target_id in loaded[relation]
@@ -3,9 +3,22 @@ from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
 from recipes.serializers import RecipeMinimizedSerializer
+from users.relations import FOLLOWING, has_relation
 
 User = get_user_model()
 
+RECIPES_LIMIT = 3
+MAX_RECIPES_LIMIT = 100
+
+
+def get_recipes_limit(request):
+    """Количество рецептов автора в подписках из параметра recipes_limit."""
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return RECIPES_LIMIT
+    return min(max(recipes_limit, 0), MAX_RECIPES_LIMIT)
+
 
 class AllFieldsRequiredUserCreateSerializer(UserCreateSerializer):
     """Сериализатор для создания пользователя."""
@@ -37,17 +50,13 @@ class AllFieldsRequiredUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        if user.is_authenticated:
-            return user.follower.filter(author=obj).exists()
-        return False
+        return has_relation(self.context, FOLLOWING, obj.id)
 
 
 class SubscribeSerializer(AllFieldsRequiredUserSerializer):
     """Сериализатор для подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -63,17 +72,11 @@ class SubscribeSerializer(AllFieldsRequiredUserSerializer):
         )
 
     def get_recipes(self, data):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit:
-            try:
-                recipes = data.recipes.all()[:int(recipes_limit)]
-            except ValueError:
-                recipes = data.recipes.all()
+        previews = self.context.get('recipes_previews')
+        if previews is not None:
+            recipes = previews.get(data.id, [])
         else:
-            recipes = data.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = data.recipes.all()[:recipes_limit]
         serializer = RecipeMinimizedSerializer(recipes, many=True)
         return serializer.data
-
-    def get_recipes_count(self, data):
-        return data.recipes.count()
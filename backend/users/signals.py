@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.feed import add_author_to_timeline, remove_author_from_timeline
+from users.authentication import invalidate_tokens, invalidate_user_tokens
+from users.models import Follow
+from users.relations import FOLLOWING, add_relation, remove_relation
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_user_tokens(instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance)
+
+
+def change_follow_counters(follow, delta):
+    """Сдвигает счётчики подписок и подписчиков на delta."""
+    User.objects.filter(pk=follow.user_id).update(
+        following_count=F('following_count') + delta,
+    )
+    User.objects.filter(pk=follow.author_id).update(
+        followers_count=F('followers_count') + delta,
+    )
+
+
+@receiver(post_save, sender=Follow)
+def add_follow(instance, created, **kwargs):
+    """Счётчики, лента и кэш подписок обновляются при любой записи:
+    из API, из админки и каскадом."""
+    if created:
+        change_follow_counters(instance, 1)
+        add_author_to_timeline(instance.user, instance.author)
+        add_relation(instance.user, FOLLOWING, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow(instance, **kwargs):
+    change_follow_counters(instance, -1)
+    remove_author_from_timeline(instance.user_id, instance.author_id)
+    remove_relation(instance.user, FOLLOWING, instance.author_id)
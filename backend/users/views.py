@@ -4,13 +4,14 @@ from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
+from recipes.pagination import UserPagination
+from recipes.services import get_recipes_previews
 from users.models import Follow
 from users.serializers import (
-    AllFieldsRequiredUserSerializer, SubscribeSerializer
+    AllFieldsRequiredUserSerializer, SubscribeSerializer, get_recipes_limit,
 )
 
 User = get_user_model()
@@ -20,7 +21,7 @@ class AllFieldsRequiredUserViewSet(UserViewSet):
     """Представление для создания и получения пользователей,
     а также их подписок."""
     queryset = User.objects.all()
-    pagination_class = PageNumberPagination
+    pagination_class = UserPagination
 
     def get_permissions(self):
         if self.action in ('list', 'create'):
@@ -41,7 +42,7 @@ class AllFieldsRequiredUserViewSet(UserViewSet):
     )
     def subscribe(self, request, id):
         follower = request.user
-        following = get_object_or_404(User, id=id)
+        following = get_object_or_404(self.get_queryset(), id=id)
 
         if request.method == 'POST':
             if follower.id == following.id:
@@ -50,10 +51,11 @@ class AllFieldsRequiredUserViewSet(UserViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+            # Счётчики, лента и кэш подписок обновляют сигналы Follow
+            # в той же транзакции, что и вставка.
             _, created = Follow.objects.get_or_create(
                 user=follower, author=following,
             )
-
             if not created:
                 return Response(
                     {'detail': 'Вы уже подписаны на этого пользователя.'},
@@ -75,9 +77,7 @@ class AllFieldsRequiredUserViewSet(UserViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            Follow.objects.filter(
-                user=follower, author=following,
-            ).delete()
+            Follow.objects.filter(user=follower, author=following).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -87,16 +87,15 @@ class AllFieldsRequiredUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        following_users = User.objects.filter(following__user=user)
+        following_users = self.get_queryset().filter(following__user=user)
 
         page = self.paginate_queryset(following_users)
+        authors = page if page is not None else list(following_users)
+        context = self.get_serializer_context()
+        context['recipes_previews'] = get_recipes_previews(
+            [author.id for author in authors], get_recipes_limit(request),
+        )
+        serializer = self.get_serializer(authors, context=context, many=True)
         if page is not None:
-            serializer = self.get_serializer(
-                page, context=self.get_serializer_context(), many=True,
-            )
             return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(
-            following_users, context=self.get_serializer_context(), many=True,
-        )
         return Response(data=serializer.data, status=status.HTTP_200_OK)